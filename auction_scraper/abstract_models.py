@@ -10,36 +10,45 @@
 #   GNU General Public License for more details.
 
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Table, Column, Integer, String, DateTime
+from sqlalchemy import Table, Column, Integer, BigInteger, SmallInteger, \
+    String, DateTime
 from sqlalchemy.types import Text
-from sqlalchemy.schema import ForeignKey
+from sqlalchemy.schema import ForeignKey, PrimaryKeyConstraint, Index
 from sqlalchemy_utils import CurrencyType
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm.decl_api import DeclarativeMeta
+from sqlalchemy.ext.declarative import declared_attr
 from datetime import datetime
 
-Base = declarative_base()
 
-#class BaseAuctionImage(Base, Image):
-#    auction_id = Column(Text(), ForeignKey('base_auction.id'), primary_key=True)
+Base = declarative_base()
 
 class TimestampBase(Base):
     __abstract__ = True
 
     date_created = Column(DateTime,  default=datetime.utcnow, nullable=False)
-    date_modified = Column(DateTime,  default=datetime.utcnow, nullable=False)
+    date_modified = Column(DateTime,  default=datetime.utcnow, nullable=False,
+        onupdate=datetime.utcnow, index=True)
 
 class BaseAuctionRelationshipMeta(DeclarativeMeta):
     def __new__(cls, clsname, bases, namespace, profile_table=None,
-            profile_table_name=None):
+            profile_table_name=None, image_table=None, snapshot_table=None):
         namespace['seller_id'] = Column(Text(),
-            ForeignKey(profile_table_name + '.id'))
+            ForeignKey(profile_table_name + '.id'), index=True)
         namespace['winner_id'] = Column(Text(),
-            ForeignKey(profile_table_name + '.id'))
+            ForeignKey(profile_table_name + '.id'), index=True)
         namespace['seller'] = relationship(profile_table, \
             backref='auctions_sold', foreign_keys=clsname + '.seller_id')
         namespace['winner'] = relationship(profile_table, \
             backref='auctions_won', foreign_keys=clsname + '.winner_id')
+        if image_table is not None:
+            # An auction's images replace those written with it before
+            namespace['images'] = relationship(image_table, \
+                backref='auction', order_by=image_table + '.position',
+                cascade='all, delete-orphan')
+        if snapshot_table is not None:
+            namespace['snapshots'] = relationship(snapshot_table, \
+                backref='auction', order_by=snapshot_table + '.observed_at')
         return super(BaseAuctionRelationshipMeta, cls). \
             __new__( cls, clsname, bases, namespace)
 
@@ -47,7 +56,8 @@ class BaseAuctionRelationshipMeta(DeclarativeMeta):
     # can't "handle extra keyword arguments gracefully"
     # https://stackoverflow.com/questions/13762231/how-to-pass-arguments-to-the-metaclass-from-the-class-definition
     def __init__(cls, clsname, bases, namespace, profile_table=None,
-            profile_table_name=None, **kwargs):
+            profile_table_name=None, image_table=None, snapshot_table=None,
+            **kwargs):
         super(BaseAuctionRelationshipMeta, cls). \
             __init__(clsname, bases, namespace, **kwargs)
 
@@ -55,20 +65,84 @@ class BaseAuction(TimestampBase):
     __abstract__ = True
     __tablename__ = 'base_auction'
 
+    @declared_attr
+    def __table_args__(cls):
+        # Prices only compare within a currency
+        return (Index(f'ix_{cls.__tablename__}_currency_latest_price',
+            'currency', 'latest_price'),)
+
     id = Column(Text(), primary_key=True)
     title = Column(Text())
     description = Column(Text())
     uri = Column(Text())
     start_time = Column(DateTime)
-    end_time = Column(DateTime)
+    end_time = Column(DateTime, index=True)
     n_bids = Column(Integer)
-    currency = Column(CurrencyType)
-    latest_price = Column(String(16))
-    starting_price = Column(String(16))
-    # image_urls: space-separated urls
-    image_urls = Column(Text())
-    # image_paths: colon-separated paths relative to some base path
-    image_paths = Column(Text(), nullable=False, default='')
+    currency = Column(CurrencyType, index=True)
+    # Prices are integers of the minor units of currency, such as cents,
+    # marked by their info so migrations can find them
+    latest_price = Column(BigInteger, info={'minor_units': True})
+    starting_price = Column(BigInteger, info={'minor_units': True})
+    # The digest of the page the auction was parsed from, and when a page
+    # with that digest was last fetched
+    content_digest = Column(String(64), index=True)
+    last_seen = Column(DateTime)
+    # When the auction was scraped after it closed, to capture its final
+    # price, or None if it hasn't been
+    final_fetched_at = Column(DateTime)
+
+class BaseAuctionImage(Base):
+    """
+    An image of an auction, keyed by the auction's id and the image's url.
+    Subclasses define auction_id, referencing their auction table.
+    """
+    __abstract__ = True
+
+    url = Column(Text(), primary_key=True)
+    # The position of the image in the auction's gallery
+    position = Column(Integer, nullable=False)
+    # The path the image was downloaded to, or None if it hasn't been
+    path = Column(Text(), index=True)
+    # The SHA-256 of the image, in hex
+    content_hash = Column(String(64), index=True)
+    byte_size = Column(Integer)
+    fetched_at = Column(DateTime)
+
+class BaseAuctionSnapshot(Base):
+    """
+    The price, number of bids and status of an auction when it was
+    observed, written only when they differ from its previous snapshot.
+    Subclasses define auction_id, referencing their auction table.
+    """
+    __abstract__ = True
+
+    # The auction attributes recorded by each bit of flags, where present
+    FLAGS = ('closed', 'sold', 'reserve_price_met')
+
+    @declared_attr
+    def __table_args__(cls):
+        # Stored in order of the primary key, which is also the index an
+        # auction's history is read by.  The series is written only when it
+        # changes, see write_rows
+        return (PrimaryKeyConstraint('auction_id', 'observed_at'),
+            {'sqlite_with_rowid': False,
+                'info': {'series': ('auction_id', 'observed_at')}})
+
+    observed_at = Column(DateTime, nullable=False)
+    # The latest price, in minor units of the auction's currency
+    price_minor = Column(BigInteger)
+    n_bids = Column(Integer)
+    flags = Column(SmallInteger, nullable=False, default=0)
+
+    @classmethod
+    def from_auction(cls, auction, observed_at):
+        flags = 0
+        for bit, name in enumerate(cls.FLAGS):
+            if getattr(auction, name, None):
+                flags |= 1 << bit
+        return cls(observed_at=observed_at, flags=flags,
+            price_minor=auction.latest_price,
+            n_bids=auction.n_bids)
 
 class BaseProfile(TimestampBase):
     __abstract__ = True
@@ -78,3 +152,5 @@ class BaseProfile(TimestampBase):
     name = Column(Text())
     description = Column(Text())
     uri = Column(Text())
+    content_digest = Column(String(64), index=True)
+    last_seen = Column(DateTime)
@@ -10,68 +10,173 @@
 #   GNU General Public License for more details.
 
 from urllib.parse import urljoin, urlparse
-from sqlalchemy import create_engine
+from sqlalchemy import select
 from sqlalchemy.orm import sessionmaker
 import os.path
 import validators
-import requests
 from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
 import unicodedata
 import traceback
 from pathlib import Path
-from termcolor import colored
 import json
+import hashlib
 import time
-
-from auction_scraper.abstract_models import Base
-
-# From https://stackoverflow.com/questions/18092354/python-split-string-without-splitting-escaped-character#21107911
-def _escape_split(s, delim):
-    i, res, buf = 0, [], ''
-    while True:
-        j, e = s.find(delim, i), 0
-        if j < 0:  # end reached
-            return res + [buf + s[i:]]  # add remainder
-        while j - e and s[j - e - 1] == '\\':
-            e += 1  # number of escapes
-        d = e // 2  # number of double escapes
-        if e != d * 2:  # odd number of escapes
-            buf += s[i:j - d - 1] + s[j]  # add the escaped char
-            i = j + 1  # and skip it
-            continue  # add more to buf
-        res.append(buf + s[i:j - d])
-        i, buf = j + len(delim), ''  # start after delim
+from datetime import datetime, timedelta
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, \
+    wait
+from functools import partial
+import re
+
+from auction_scraper.migrations import upgrade_schema
+from auction_scraper.http_session import create_http_session
+from auction_scraper.http_cache import HTTPCache
+from auction_scraper.images import ImageDownloader, image_file_name
+from auction_scraper.persistence import PersistenceService
+from auction_scraper.prices import price_history
+from auction_scraper.scheduler import plan_refresh, fresh_profiles, \
+    CloseSchedule, closing_auctions
+from auction_scraper.storage import sqlite_pragmas, create_sqlite_engine
+from auction_scraper.rate_limit import RateLimiter
+from auction_scraper.retry import RetryPolicy, CircuitBreaker, \
+    HTTPStatusError
 
 class UnexpectedPageError(Exception):
-    def __init__(self, page):
+    def __init__(self, page=None):
         self.message = 'Failed to parse page due to unexpected contents. This could be due to the scraper being blocked by anti-scraper measures.'
         self.page = page
 
     def __str__(self):
         return f'{self.message}'
 
+    def __reduce__(self):
+        # Raised in parse workers, so leave the page behind when pickled
+        return (type(self), ())
+
 class SearchResult():
     def __init__(self, name, uri):
         self.name = name
         self.uri = uri
 
+class RawPage():
+    """
+    A fetched page, as passed from the fetch stage to the parse stage: its
+    uri, the raw bytes and encoding of the response, and any further
+    documents the backend fetched alongside it, keyed by name in extras.
+    Holds no reference to the network, so can be parsed in another process.
+    digest is set once the page's digest has been computed.
+    """
+    def __init__(self, uri, content, encoding=None, extras=None):
+        self.uri = uri
+        self.content = content
+        self.encoding = encoding
+        self.extras = extras if extras is not None else {}
+        self.digest = None
+
+    @property
+    def text(self):
+        try:
+            return str(self.content, self.encoding or 'utf-8',
+                errors='replace')
+        except LookupError:
+            return str(self.content, 'utf-8', errors='replace')
+
+def page_digest(*parts):
+    """
+    Returns the SHA-256, in hex, of parts: bytes, strs, or values that can
+    be serialised as JSON.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        elif not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, default=str) \
+                .encode('utf-8')
+        # Prefixed by length, so parts can't run into each other
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.hexdigest()
+
+# The scraper each parse worker process parses with, set once by
+# _init_parse_worker rather than pickled with every page
+_worker_scraper = None
+
+def _init_parse_worker(scraper):
+    global _worker_scraper
+    _worker_scraper = scraper
+
+def _parse_in_worker(kind, raw):
+    return _worker_scraper._parse_page(kind, raw)
+
 class AbstractAuctionScraper():
     # Defined by subclass
     auction_table = None
     profile_table = None
+    auction_image_table = None
+    auction_snapshot_table = None
     base_uri = None
     auction_suffix = None
     profile_suffix = None
     search_suffix = None
     backend_name = None
-    cooldown = None
-    cooldown_timestamp = None
+    # Headers sent with every request made by the backend
+    default_headers = None
+    # {host: (requests per second, burst)}, see RateLimiter
+    rate_limits = None
+    # The BeautifulSoup tree builder used when none is specified, falling
+    # back to html.parser if it isn't installed
+    default_parser = 'html.parser'
+    # SoupStrainers selecting the parts of each kind of page the backend's
+    # extractors use, or None to parse the whole page
+    auction_parse_only = None
+    profile_parse_only = None
+    search_parse_only = None
+    # Boolean columns of auction_table, any of which being true marks an
+    # auction as final, so that refreshes never scrape it again
+    auction_final_columns = ()
+    # Statuses of an auction page that has gone for good, after which
+    # follow_closes marks the auction final rather than retrying it
+    gone_statuses = (404, 410)
+
+    # Iframes resolved by _get_page are fetched only if their src matches
+    # a pattern in iframe_allow (when set) and none in iframe_deny
+    iframe_allow = None
+    iframe_deny = [
+        r'doubleclick\.net',
+        r'googlesyndication\.com',
+        r'googletagmanager\.com',
+        r'google-analytics\.com',
+        r'adservice\.google\.',
+        r'amazon-adsystem\.com',
+        r'facebook\.com/tr',
+        r'/ads?/',
+    ]
+    # Seconds allowed for all of a page's iframes to be fetched
+    iframe_timeout = 10
+    # Iframe bodies larger than this many bytes are skipped
+    iframe_max_size = 2 * 1024 * 1024
+
+    # Attributes holding connections, locks and threads, which stay behind
+    # when the scraper is pickled into a parse worker
+    _process_local = ('session', 'rate_limiter', 'circuit_breaker',
+        'http_cache', 'image_downloader', '_iframe_executor',
+        '_async_executor', '_host_semaphores', 'engine', 'Session', 'writer')
 
     def __init__(self, db_path, data_location=None, base_uri=None, \
             auction_suffix=None, profile_suffix=None, \
             search_suffix = None, auction_save_path=None, \
             profile_save_path=None, search_save_path=None, \
-            image_save_path=None, verbose=False, cooldown=0, **_):
+            image_save_path=None, verbose=False, cooldown=0, \
+            pool_connections=10, pool_maxsize=10, headers=None, \
+            rate_limits=None, rate_limit_path=None, rate_limiter=None, \
+            image_workers=4, cache_path=None, cache_size=256 * 1024 * 1024, \
+            search_workers=4, max_retries=3, retry_backoff=1, \
+            circuit_threshold=5, circuit_reset=60, parser=None, \
+            write_batch_size=100, write_delay=5, write_queue_size=1000, \
+            sqlite_profile='concurrent-readers', sqlite_options=None, **_):
         self.verbose = verbose
 
         if auction_suffix is not None:
@@ -87,7 +192,56 @@ class AbstractAuctionScraper():
         self.base_profile_uri = urljoin(self.base_uri, self.profile_suffix)
         self.base_search_uri = urljoin(self.base_uri, self.search_suffix)
 
-        self.cooldown = cooldown
+        # A cooldown overrides the backend's limits with a fixed interval
+        # between requests to each host
+        if rate_limiter is not None:
+            self.rate_limiter = rate_limiter
+        elif cooldown:
+            self.rate_limiter = RateLimiter(default=(1 / cooldown, 1),
+                shared_path=rate_limit_path)
+        else:
+            if rate_limits is None:
+                rate_limits = self.rate_limits
+            self.rate_limiter = RateLimiter(rate_limits,
+                shared_path=rate_limit_path)
+
+        if parser is not None:
+            if builder_registry.lookup(parser) is None:
+                raise ValueError(f'The parser {parser} is not installed')
+            self.parser = parser
+        elif builder_registry.lookup(self.default_parser) is not None:
+            self.parser = self.default_parser
+        else:
+            self.parser = 'html.parser'
+
+        # Transient failures are retried, and failing hosts paused
+        self.retry_policy = RetryPolicy(max_retries=max_retries,
+            backoff=retry_backoff)
+        self.circuit_breaker = CircuitBreaker(threshold=circuit_threshold,
+            reset_timeout=circuit_reset)
+
+        # Optionally serve and revalidate pages through an on-disk cache
+        if cache_path is not None:
+            self.http_cache = HTTPCache(cache_path, max_size=cache_size)
+        else:
+            self.http_cache = None
+
+        self.image_downloader = ImageDownloader(self._fetch,
+            max_workers=image_workers)
+        self._iframe_executor = ThreadPoolExecutor(max_workers=4)
+        self.search_workers = search_workers
+
+        # Per-host in-flight limits, configured by scrape_search_to_db_async
+        self._host_concurrency = 1
+        self._host_semaphores = {}
+        self._async_executor = None
+
+        # All fetches share one pool of keep-alive connections per host
+        session_headers = dict(self.default_headers or {})
+        if headers is not None:
+            session_headers.update(headers)
+        self.session = create_http_session(pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize, headers=session_headers)
 
         # Configure default data locations
         if data_location is not None:
@@ -134,31 +288,62 @@ class AbstractAuctionScraper():
         if self.auction_table is None or self.profile_table is None:
             raise ValueError('self.auction_table and self.profile_table must be set in the __init__ method of a subclass of AbstractAuctionScraper')
 
-        # Define the application base directory
-        self.engine = create_engine('sqlite:///' + os.path.abspath(db_path), \
-            echo=verbose, connect_args={'timeout': 20})
+        # Define the application base directory.  sqlite_options override
+        # the pragmas of sqlite_profile
+        self.engine = create_sqlite_engine(db_path, sqlite_pragmas(
+            sqlite_profile, **(sqlite_options or {})), echo=verbose)
         self.Session = sessionmaker(bind=self.engine)
 
-        # Create the database tables
-        Base.metadata.create_all(self.engine)
+        # Create the database tables, upgrading those of older versions
+        upgrade_schema(self.engine, verbose=verbose)
+
+        # Scraped models are upserted in batches, one transaction each, by
+        # a single writing thread
+        self.writer = PersistenceService(self.engine,
+            batch_size=write_batch_size, max_delay=write_delay,
+            queue_size=write_queue_size)
+
+    def _images(self, image_urls):
+        """
+        Returns the image models of an auction with image_urls, in order,
+        for the backend to set as the auction's images.
+        """
+        # Each url is kept once, at its first position
+        return [self.auction_image_table(url=url, position=i) \
+            for i, url in enumerate(dict.fromkeys(filter(None, image_urls)))]
 
     def _download_images(self, image_urls, auction_id):
-        # backend-name  instead of name prefix
-        image_paths = []
+        urls_and_paths = []
         for url in image_urls:
-            name = f'{self.backend_name}_{auction_id}_' + \
-                '_'.join(urlparse(url).path.split('/'))
+            name = image_file_name(self.backend_name, auction_id, url)
             path = self.image_save_path.joinpath(name).resolve()
-            image_paths.append(path)
+            urls_and_paths.append((url, path))
+
+        return self.image_downloader.download(urls_and_paths)
 
-            if not path.is_file():
-                r = requests.get(url)
-                if not r.ok:
-                    print(colored('Could not find page: {}'.format(url), 'red'))
-                with open(path, 'wb') as f:
-                    f.write(r.content)
+    def price_history(self, auction_ids, since=None):
+        """
+        Reads the price history of each of auction_ids, from the snapshots
+        observed at or after since if given.
+        Returns a dict {auction_id: [(observed_at, price_minor, n_bids,
+        flags)]}
+        """
+        with self.engine.connect() as connection:
+            return price_history(connection, self.auction_snapshot_table,
+                auction_ids, since)
 
-        return image_paths
+    def undownloaded_images(self, limit=None):
+        """
+        Returns the auction images in the database that haven't been
+        downloaded, up to limit.
+        Returns a [BaseAuctionImage]
+        """
+        with self.Session() as session:
+            query = session.query(self.auction_image_table) \
+                .filter(self.auction_image_table.path.is_(None))
+            if limit is not None:
+                query = query.limit(limit)
+            return query.all()
 
     def _normalise_text(self, text):
         """
@@ -175,49 +360,359 @@ class AbstractAuctionScraper():
         norm = norm.encode('ascii', errors='ignore').decode('unicode-escape')
         return norm
 
+    def close(self):
+        """
+        Writes any queued models, waits for queued image downloads, then
+        closes the pooled HTTP connections held by the scraper.
+        """
+        self.writer.close()
+        self.engine.dispose()
+        self.image_downloader.close()
+        self._iframe_executor.shutdown(wait=True)
+        self.session.close()
+        if self.http_cache is not None:
+            self.http_cache.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for k in self._process_local:
+            state[k] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _fetch(self, uri, **kwargs):
+        """
+        Requests uri through the scraper's pooled session, returning a
+        requests.Response.  kwargs are passed through to session.get.
+        Waits as required by the rate limit of the host of uri.
+        Transient failures are retried according to self.retry_policy, and
+        counted towards self.circuit_breaker for the host, as are responses
+        refusing the scraper access.
+        If the scraper has an http_cache, plain requests are served from it
+        where fresh, and revalidated against the site where stale.
+        """
+        host = urlparse(uri).netloc
+
+        def send(uri, headers=None, **kwargs):
+            attempt = 0
+            while True:
+                self.circuit_breaker.wait(host)
+                waited = self.rate_limiter.acquire(uri)
+                if self.verbose and waited > 0:
+                    print('Waited {:.2f}s for rate limit of {}'.format( \
+                        waited, host))
+
+                try:
+                    r = self.session.get(uri, headers=headers, **kwargs)
+                except Exception as e:
+                    if not self.retry_policy.is_transient(exception=e):
+                        raise e
+                    self.circuit_breaker.record_failure(host)
+                    delay = self.retry_policy.delay(attempt)
+                    if delay is None:
+                        raise e
+                    print(f'Retrying {uri} in {delay:.1f}s after: {e}')
+                else:
+                    if not self.retry_policy.is_transient(response=r):
+                        if r.status_code in \
+                                self.circuit_breaker.blocked_statuses:
+                            self.circuit_breaker.record_failure(host,
+                                'blocked')
+                        elif r.ok:
+                            self.circuit_breaker.record_success(host)
+                        return r
+                    self.circuit_breaker.record_failure(host)
+                    delay = self.retry_policy.delay(attempt, r)
+                    if delay is None:
+                        return r
+                    print(f'Retrying {uri} in {delay:.1f}s after status '
+                        f'{r.status_code}')
+                    r.close()
+                time.sleep(delay)
+                attempt += 1
+
+        if self.http_cache is None or kwargs:
+            return send(uri, **kwargs)
+        return self.http_cache.fetch(send, uri)
+
+    def report_cache_stats(self):
+        """
+        Prints the hit, revalidation and miss counts of the http_cache.
+        """
+        if self.http_cache is not None:
+            print('HTTP cache: {hits} hits, {revalidations} revalidated, '
+                '{misses} misses, {size} bytes stored' \
+                .format(**self.http_cache.stats()))
 
-    def _get_page(self, uri, resolve_iframes=False):
+    def _make_soup(self, markup, parse_only=None):
         """
-        Requests the page from uri and returns a bs4 soup.
-        If resolve_iframes, resolves all iframes in the page.
+        Parses markup into a bs4 soup with the scraper's parser.
+        If parse_only is given, only builds the elements it matches, falling
+        back to the whole document if it matches nothing.
         """
-        now = time.time()
-        if self.cooldown_timestamp is not None and \
-                self.cooldown_timestamp + self.cooldown > now:
-            sleep_time = self.cooldown - (now - self.cooldown_timestamp)
+        if parse_only is not None:
+            soup = BeautifulSoup(markup, self.parser, parse_only=parse_only)
+            if soup.find(True) is not None:
+                return soup
             if self.verbose:
-                print('Awaiting cooldown expiry in {}s'.format( \
-                    int(sleep_time)))
-            time.sleep(sleep_time)
-        self.cooldown_timestamp = time.time()
+                print('Strained page was empty, parsing the whole page')
+        return BeautifulSoup(markup, self.parser)
 
-        r = requests.get(uri)
+    def _get_response(self, uri):
+        """
+        Requests the page from uri and returns the response, raising
+        HTTPStatusError if the site responds with an error.
+        """
+        r = self._fetch(uri)
         if not r.ok:
-            raise ValueError('The requested page could not be found')
-        soup = BeautifulSoup(r.text, 'html.parser')
+            raise HTTPStatusError(uri, r.status_code)
+        return r
+
+    def _get_raw_page(self, uri, extras=None):
+        """
+        Requests the page from uri and returns it as a RawPage, for parsing
+        later.
+        """
+        r = self._get_response(uri)
+        return RawPage(uri, r.content, r.encoding or r.apparent_encoding,
+            extras)
+
+    def _get_page(self, uri, resolve_iframes=False, parse_only=None):
+        """
+        Requests the page from uri and returns a bs4 soup.
+        If resolve_iframes, resolves all iframes in the page.
+        If parse_only is given, the soup only contains the elements it
+        matches, as for _make_soup.
+        """
+        soup = self._make_soup(self._get_response(uri).text, parse_only)
         if resolve_iframes:
-            for iframe in soup.find_all('iframe'):
-                try:
-                    src = iframe['src']
-                except KeyError:
-                    continue
-
-                ir = requests.get(src)
-                if not ir.ok:
-                    continue
-                iframe_soup = BeautifulSoup(ir.text, 'html.parser')
-                iframe.append(iframe_soup)
+            self._resolve_iframes(soup, uri)
         return soup
 
+    def _iframe_allowed(self, src):
+        if self.iframe_allow is not None and \
+                not any(re.search(p, src) for p in self.iframe_allow):
+            return False
+        return not any(re.search(p, src) for p in self.iframe_deny)
+
+    def _fetch_iframe(self, src):
+        """
+        Returns the body of the iframe at src, or None if it could not be
+        found or is larger than self.iframe_max_size.
+        """
+        with self._fetch(src, stream=True) as r:
+            if not r.ok:
+                return None
+            chunks, size = [], 0
+            for chunk in r.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > self.iframe_max_size:
+                    if self.verbose:
+                        print(f'Skipping iframe larger than '
+                            f'{self.iframe_max_size} bytes: {src}')
+                    return None
+        return b''.join(chunks)
+
+    def _fetch_iframes(self, srcs, uri):
+        """
+        Fetches the allowed iframes of the page at uri with srcs in
+        parallel, returning a dict mapping each src to its body.  Iframes
+        not fetched within self.iframe_timeout seconds are left out.
+        """
+        futures = {}
+        for src in srcs:
+            src = urljoin(uri, src)
+            if src in futures.values() or not self._iframe_allowed(src):
+                continue
+            futures[self._iframe_executor.submit(self._fetch_iframe, src)] = \
+                src
+
+        done, not_done = wait(futures, timeout=self.iframe_timeout)
+        for future in not_done:
+            future.cancel()
+            if self.verbose:
+                print('Timed out resolving an iframe of {}'.format(uri))
+
+        bodies = {}
+        for future in done:
+            try:
+                body = future.result()
+            except Exception as e:
+                if self.verbose:
+                    print('Could not resolve an iframe of {}: {}' \
+                        .format(uri, e))
+                continue
+            if body is not None:
+                bodies[futures[future]] = body
+        return bodies
+
+    def _insert_iframes(self, soup, uri, bodies):
+        """
+        Appends the parsed contents of each iframe of soup whose src has a
+        body in bodies, as returned by _fetch_iframes, to its iframe tag.
+        """
+        for iframe in soup.find_all('iframe'):
+            try:
+                body = bodies[urljoin(uri, iframe['src'])]
+            except KeyError:
+                continue
+            iframe.append(self._make_soup(body))
+
+    def _resolve_iframes(self, soup, uri):
+        """
+        Fetches the allowed iframes of soup in parallel, appending each
+        one's parsed contents to its iframe tag.  Iframes not fetched
+        within self.iframe_timeout seconds are left empty.
+        """
+        srcs = [i['src'] for i in soup.find_all('iframe') if i.has_attr('src')]
+        self._insert_iframes(soup, uri, self._fetch_iframes(srcs, uri))
+
     def _get_json(self, uri):
         """
         Requests the page from uri and returns a json object.
         If resolve_iframes, resolves all iframes in the page.
         """
-        r = requests.get(uri)
-        if not r.ok:
-            raise ValueError('The requested page could not be found')
-        return json.loads(r.text)
+        return json.loads(self._get_response(uri).text)
+
+    def _host_semaphore(self, uri):
+        """
+        Returns the asyncio.Semaphore bounding in-flight requests to the host
+        of uri, for the currently running async scrape.
+        """
+        host = urlparse(uri).netloc
+        try:
+            return self._host_semaphores[host]
+        except KeyError:
+            semaphore = asyncio.Semaphore(self._host_concurrency)
+            self._host_semaphores[host] = semaphore
+            return semaphore
+
+    async def _run_for_host(self, uri, func, *args):
+        """
+        Runs the blocking func(*args) on the async scrape's thread pool,
+        counting towards the in-flight limit of the host of uri.
+        """
+        loop = asyncio.get_event_loop()
+        async with self._host_semaphore(uri):
+            return await loop.run_in_executor(self._async_executor, \
+                partial(func, *args))
+
+    async def _get_page_async(self, uri, resolve_iframes=False,
+            parse_only=None):
+        """
+        Async variant of _get_page, bounded by the per-host concurrency of
+        the running async scrape.
+        """
+        return await self._run_for_host(uri, self._get_page, uri,
+            resolve_iframes, parse_only)
+
+    async def _get_raw_page_async(self, uri, extras=None):
+        """
+        Async variant of _get_raw_page, bounded by the per-host concurrency
+        of the running async scrape.
+        """
+        return await self._run_for_host(uri, self._get_raw_page, uri, extras)
+
+    async def _get_json_async(self, uri):
+        """
+        Async variant of _get_json, bounded by the per-host concurrency of
+        the running async scrape.
+        """
+        return await self._run_for_host(uri, self._get_json, uri)
+
+    def _scrape_guarded(self, scrape_page, uri):
+        """
+        Calls scrape_page(uri), counting pages that show the scraper has
+        been blocked towards the circuit breaker of the host of uri.
+        """
+        host = urlparse(uri).netloc
+        try:
+            result = scrape_page(uri)
+        except UnexpectedPageError as e:
+            self.circuit_breaker.record_failure(host, 'blocked')
+            raise e
+        self.circuit_breaker.record_success(host, 'blocked')
+        return result
+
+    def _digest(self, kind, raw):
+        """
+        Returns the digest of the kind page raw, computing it once.
+        """
+        if raw.digest is None:
+            raw.digest = getattr(self, f'_{kind}_digest')(raw)
+        return raw.digest
+
+    def _parse_page(self, kind, raw):
+        """
+        Parses the kind page raw with _parse_auction_page or
+        _parse_profile_page, recording its digest and when it was seen on
+        the model, and for auctions, a snapshot of their price.
+        """
+        model = getattr(self, f'_parse_{kind}_page')(raw)
+        model.content_digest = self._digest(kind, raw)
+        model.last_seen = datetime.utcnow()
+        if kind == 'auction' and self.auction_snapshot_table is not None:
+            model.snapshots = [self.auction_snapshot_table.from_auction(model,
+                model.last_seen)]
+        return model
+
+    def _find_unchanged(self, kind, raw):
+        """
+        Returns the row of the kind table parsed from a page with the same
+        digest as raw, or None if there isn't one.  The row has the id,
+        and for auctions the seller_id.
+        """
+        table = self.auction_table if kind == 'auction' \
+            else self.profile_table
+        columns = [table.id, table.seller_id] if kind == 'auction' \
+            else [table.id]
+        with self.engine.connect() as connection:
+            return connection.execute(select(*columns).where(
+                table.content_digest == self._digest(kind, raw)).limit(1)) \
+                .first()
+
+    def _touch(self, kind, model_id):
+        """
+        Records that the kind row with model_id was seen unchanged,
+        returning the writer's Future.
+        """
+        table = self.auction_table if kind == 'auction' \
+            else self.profile_table
+        return self.writer.submit({'id': model_id,
+            'last_seen': datetime.utcnow()}, table)
+
+    def _scrape_if_changed(self, kind, uri, save_page=False,
+            save_images=False):
+        """
+        Scrapes the kind page at uri as scrape_auction or scrape_profile
+        would, unless a row was parsed from a page with the same digest,
+        in which case parsing and writing are skipped and only its
+        last_seen is updated.
+        Returns a tuple (model, None), or (None, unchanged row).
+        """
+        fetch_page = getattr(self, f'_fetch_{kind}_page')
+        def scrape_page(uri):
+            raw = fetch_page(uri)
+            row = self._find_unchanged(kind, raw)
+            if row is not None:
+                return None, row
+            return self._parse_page(kind, raw), raw.content
+
+        model, page = self._scrape_guarded(scrape_page, uri)
+        if model is None:
+            self._touch(kind, page.id)
+            return None, page
+        if kind == 'auction':
+            self._save_auction(model, page, save_page, save_images)
+        else:
+            self._save_profile(model, page, save_page)
+        return model, None
 
     def scrape_auction(self, auction, save_page=False, save_images=False):
         """
@@ -244,28 +739,34 @@ class AbstractAuctionScraper():
 
         # Get the auction page
         # auction_id should be returned in case it was specified by uri
-        auction, html = self._scrape_auction_page(auction_uri)
+        auction, page = self._scrape_guarded(self._scrape_auction_page,
+            auction_uri)
+        self._save_auction(auction, page, save_page, save_images)
+        return auction
 
+    def _save_auction(self, auction, page, save_page=False, save_images=False):
+        """
+        Writes out the page of auction, and downloads its images recording
+        where they were saved, as required.
+        """
         # Save if required
         if save_page:
             name = self.auction_save_name.format(auction.id)
-            with open(self.auction_save_path.joinpath(name), 'w') as f:
-                f.write(html)
+            with open(self.auction_save_path.joinpath(name), 'wb') as f:
+                f.write(page)
 
-        # Save images if required, updating image_paths
+        # Save images if required, recording them on the image models
         if save_images:
-            new_image_paths = list(map(str, self._download_images(filter(None, auction.image_urls.split(' ')), auction.id)))
-            if auction.image_paths is not None:
-                existing_image_paths = _escape_split( \
-                    auction.image_paths, ':')
-            else:
-                existing_image_paths = []
-
-            auction.image_paths = ':'.join(list(set(new_image_paths).union( \
-                existing_image_paths)))
-
-        return auction
-
+            images = auction.images
+            downloaded = self._download_images([i.url for i in images],
+                auction.id)
+            fetched_at = datetime.utcnow()
+            for image, d in zip(images, downloaded):
+                if d is not None:
+                    image.path = str(d.path)
+                    image.content_hash = d.content_hash
+                    image.byte_size = d.byte_size
+                    image.fetched_at = fetched_at
 
     def scrape_profile(self, profile, save_page=False):
         """
@@ -289,15 +790,19 @@ class AbstractAuctionScraper():
                 "Can't save page: profile_save_path not specified on scraper initialisation")
 
         # Get the profile page
-        profile, html = self._scrape_profile_page(profile_uri)
+        profile, page = self._scrape_guarded(self._scrape_profile_page,
+            profile_uri)
+        self._save_profile(profile, page, save_page)
+        return profile
 
-        # Save if required
+    def _save_profile(self, profile, page, save_page=False):
+        """
+        Writes out the page of profile if required.
+        """
         if save_page:
             name = self.profile_save_name.format(profile.id)
-            with open(self.profile_save_path.joinpath(name), 'w') as f:
-                f.write(html)
-
-        return profile
+            with open(self.profile_save_path.joinpath(name), 'wb') as f:
+                f.write(page)
 
     def scrape_search(self, query_string, n_results=None, save_page=False,
             save_images=False):
@@ -317,28 +822,61 @@ class AbstractAuctionScraper():
             raise ValueError(
                 "Can't save images: data-location not specified on scraper initialisation")
 
-        results = {}
-        n_page = 1
-        # De-paginate the search results
-        while n_results is None or len(results) < n_results:
+        def scrape_page(n_page):
             uri = self._generate_search_uri(query_string, n_page)
-            n_res = len(results)
             if self.verbose:
                 print(f'Scraping search page with uri {uri}')
-            res, html = self._scrape_search_page(uri)
+            res, total, page = self._scrape_guarded(
+                self._scrape_search_page, uri)
             if self.verbose:
                 print(res)
 
-            # Save the html page here if required
+            # Save the page here if required
             if save_page:
                 name = self.search_save_name.format(query_string, n_page)
-                with open(self.search_save_path.joinpath(name), 'w') as f:
-                    f.write(html)
+                with open(self.search_save_path.joinpath(name), 'wb') as f:
+                    f.write(page)
+            return res, total
 
-            results = {**results, **res}
-            if len(results) == n_res:
-                break
-            n_page += 1
+        res, total = scrape_page(1)
+        results = dict(res)
+        page_size = len(res)
+        n_page = 1
+
+        wanted = n_results
+        if total is not None:
+            wanted = total if n_results is None else min(total, n_results)
+
+        # De-paginate the search results, fetching as many pages ahead in
+        # parallel as the total or n_results say are still needed
+        with ThreadPoolExecutor(max_workers=self.search_workers) as executor:
+            while page_size and (n_results is None or len(results) < n_results):
+                if wanted is not None:
+                    last_page = n_page + \
+                        -(-(wanted - len(results)) // page_size)
+                else:
+                    last_page = n_page + 1
+                if last_page <= n_page:
+                    break
+
+                futures = [executor.submit(scrape_page, p) \
+                    for p in range(n_page + 1, last_page + 1)]
+                exhausted = False
+                for future in futures:
+                    res, _ = future.result()
+                    n_res = len(results)
+                    results.update(res)
+                    # An empty or fully duplicated page is the last one.
+                    # Pages may be short before then, as where results
+                    # were withdrawn
+                    if len(results) == n_res:
+                        exhausted = True
+                        break
+                for future in futures:
+                    future.cancel()
+                n_page = last_page
+                if exhausted:
+                    break
 
         # Cut down the number of results to n_results
         if n_results is not None:
@@ -349,19 +887,39 @@ class AbstractAuctionScraper():
             print(f'results: {results}')
         return results
 
+    def _write_to_db(self, model):
+        """
+        Upserts a single auction or profile model into the database
+        immediately, along with any models queued before it.
+        """
+        self.writer.write(model)
+
+    def _collect_written(self, submitted, exceptions):
+        """
+        Waits for the writes of submitted, a list of (kind, model, future)
+        from self.writer.submit, and returns the models written.  Those
+        that failed have their errors added to exceptions.
+        """
+        self.writer.flush()
+        written = []
+        for kind, model, future in submitted:
+            e = future.exception()
+            if e is None:
+                written.append(model)
+                continue
+            exceptions.append(e)
+            print(f'Error writing {kind} {model.id}')
+            print(''.join(traceback.format_exception(type(e), e,
+                e.__traceback__)))
+        return written
+
     def scrape_auction_to_db(self, auction, save_page=False, save_images=False):
         """
         Scrape an auction page, writing the resulting auction to the database.
         Returns a BaseAuction
         """
         auction = self.scrape_auction(auction, save_page, save_images)
-        session = self.Session()
-        try:
-            session.merge(auction)
-            session.commit()
-        except Exception as e:
-            session.close()
-            raise e
+        self._write_to_db(auction)
         return auction
 
     def scrape_profile_to_db(self, profile, save_page=False):
@@ -370,60 +928,114 @@ class AbstractAuctionScraper():
         Returns a BaseProfile
         """
         profile = self.scrape_profile(profile, save_page)
-        session = self.Session()
-        try:
-            session.merge(profile)
-            session.commit()
-        except Exception as e:
-            session.close()
-            raise e
+        self._write_to_db(profile)
         return profile
 
-    def scrape_search_to_db(self, query_strings, n_results=None, \
-            save_page=False, save_images=False, cooldown=0):
+    def _scrape_searches(self, query_strings, n_results=None, save_page=False,
+            save_images=False):
         """
-        Scrape a set of query_strings, writing the resulting auctions and profiles
-        to the database.
-        Returns a tuple ([BaseAuction], [BaseProfile])
+        Scrapes each of query_strings, deduplicating results across queries.
+        Returns a dict {auction_id: SearchResult}
         """
         if isinstance(query_strings, str):
             query_strings = [query_strings]
 
-        # Get search results, deduplicating across queries through dict merging
+        # Get search results, deduplicating across queries through dict merging.
+        # Transient errors are retried by _fetch
         results = {}
         for query_string in query_strings:
             print(f'Scraping query string {query_string}')
-            # Retry the search three times, to deal with transient errors
-            for i in range(3):
-                try:
-                    results = {**results, \
-                            **self.scrape_search(query_string, n_results, save_page,
-                                save_images)}
-                except Exception as e:
-                    if i == 2:
-                        raise e
-                    else:
-                        print(e)
-                        time.sleep(1)
-                else:
-                    break
+            results.update(self.scrape_search(query_string, n_results,
+                save_page, save_images))
+        return results
 
-        scraped_profile_ids = set()
+    def _plan_refresh(self, results, refresh):
+        """
+        Returns those of results, {auction_id: SearchResult}, that are due
+        to be scraped under the RefreshPolicy refresh, or all of them if
+        refresh is None.
+        """
+        if refresh is None:
+            return results
+        with self.engine.connect() as connection:
+            plan = plan_refresh(connection, self.auction_table,
+                [str(auction_id) for auction_id in results], refresh,
+                self.auction_final_columns)
+        print(plan)
+        due = set(plan.due)
+        return {k: v for k, v in results.items() if str(k) in due}
+
+    def _fresh_profile_ids(self, profile_ttl):
+        """
+        Returns the set of ids of the stored profiles refreshed within the
+        timedelta profile_ttl, which searches don't scrape again, or an
+        empty set if profile_ttl is None.
+        """
+        if profile_ttl is None:
+            return set()
+        with self.engine.connect() as connection:
+            fresh = fresh_profiles(connection, self.profile_table, profile_ttl)
+        print(f'{len(fresh)} profiles were refreshed within {profile_ttl}')
+        return fresh
+
+    def _scrape_for_search(self, kind, uri, save_page, save_images,
+            skip_unchanged):
+        """
+        Returns a tuple (model, None) of the kind page at uri, or if
+        skip_unchanged and it's unchanged, (None, unchanged row).
+        """
+        if skip_unchanged:
+            return self._scrape_if_changed(kind, uri, save_page, save_images)
+        if kind == 'auction':
+            return self.scrape_auction(uri, save_page, save_images), None
+        return self.scrape_profile(uri, save_page), None
+
+    def scrape_search_to_db(self, query_strings, n_results=None, \
+            save_page=False, save_images=False, cooldown=0, \
+            skip_unchanged=True, refresh=None, profile_ttl=None):
+        """
+        Scrape a set of query_strings, writing the resulting auctions and profiles
+        to the database.
+        If skip_unchanged, pages whose digest matches the row they were last
+        parsed into are neither parsed nor written, and are left out of the
+        results.
+        If refresh, a RefreshPolicy, is given, only the results it finds due
+        are scraped.  Profiles refreshed within profile_ttl, a timedelta,
+        aren't scraped again.
+        Returns a tuple ([BaseAuction], [BaseProfile])
+        """
+        results = self._scrape_searches(query_strings, n_results, save_page,
+            save_images)
+        results = self._plan_refresh(results, refresh)
+
+        # Models are written by the writer's thread while scraping continues
+        scraped_profile_ids = self._fresh_profile_ids(profile_ttl)
         exceptions = []
         auctions = []
         profiles = []
         for auction_id, search in results.items():
             try:
                 print('Scraping auction url {}'.format(search.uri))
-                auction = self.scrape_auction_to_db(search.uri, save_page, \
-                    save_images)
-                auctions.append(auction)
-                profile_id = auction.seller_id
+                auction, unchanged = self._scrape_for_search('auction',
+                    search.uri, save_page, save_images, skip_unchanged)
+                if unchanged is None:
+                    auctions.append(('auction', auction,
+                        self.writer.submit(auction)))
+                    profile_id = auction.seller_id
+                else:
+                    print(f'Auction {unchanged.id} is unchanged')
+                    profile_id = unchanged.seller_id
 
                 if profile_id is not None and profile_id not in scraped_profile_ids:
                     print('Scraping profile {}'.format(profile_id))
-                    profile = self.scrape_profile_to_db(profile_id, save_page)
-                    profiles.append(profile)
+                    profile, unchanged = self._scrape_for_search('profile',
+                        self.base_profile_uri.format(profile_id), save_page,
+                        False, skip_unchanged)
+                    if unchanged is None:
+                        profiles.append(('profile', profile,
+                            self.writer.submit(profile)))
+                    else:
+                        print(f'Profile {unchanged.id} is unchanged')
                     scraped_profile_ids.add(profile_id)
 
             except Exception as e:
@@ -431,17 +1043,353 @@ class AbstractAuctionScraper():
                 print(f'Error processing auction {auction_id}')
                 print(traceback.format_exc())
 
+        auctions = self._collect_written(auctions, exceptions)
+        profiles = self._collect_written(profiles, exceptions)
+
+        if exceptions:
+            raise Exception(exceptions)
+
+        return auctions, profiles
+
+    def follow_closes(self, horizon=timedelta(hours=6), \
+            grace=timedelta(minutes=5), window=timedelta(minutes=5), \
+            save_page=False, save_images=False):
+        """
+        Scrapes each stored auction closing within horizon, or already
+        closed, exactly once after it closes, writing it to the database
+        with its final_fetched_at set.  Auctions are taken from a
+        CloseSchedule in batches of those closing within window of each
+        other, each scraped grace after the last of them closes.  Auctions
+        found to have been extended are rescheduled.
+        Returns [BaseAuction]
+        """
+        with self.engine.connect() as connection:
+            closing = closing_auctions(connection, self.auction_table,
+                datetime.utcnow() + horizon, self.auction_final_columns)
+        schedule = CloseSchedule(grace, window)
+        uris = {}
+        for auction_id, end_time, uri in closing:
+            schedule.push(auction_id, end_time)
+            uris[auction_id] = uri or auction_id
+        print(f'Following {len(schedule)} auctions closing within {horizon}')
+
+        auctions = []
+        exceptions = []
+        while True:
+            batch = schedule.pop_batch()
+            if batch is None:
+                break
+            due, auction_ids = batch
+            delay = (due - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                print(f'Waiting until {due} to scrape {len(auction_ids)} '
+                    'auctions')
+                time.sleep(delay)
+
+            for auction_id in auction_ids:
+                try:
+                    print('Scraping closed auction {}'.format(auction_id))
+                    auction = self.scrape_auction(uris[auction_id],
+                        save_page, save_images)
+                    now = datetime.utcnow()
+                    if auction.end_time is not None and \
+                            auction.end_time > now:
+                        print(f'Auction {auction_id} now closes at '
+                            f'{auction.end_time}')
+                        schedule.push(auction_id, auction.end_time)
+                    else:
+                        auction.final_fetched_at = now
+                    auctions.append(('auction', auction,
+                        self.writer.submit(auction)))
+                except HTTPStatusError as e:
+                    if e.status_code not in self.gone_statuses:
+                        exceptions.append(e)
+                        print(f'Error processing auction {auction_id}')
+                        print(traceback.format_exc())
+                        continue
+                    print(f'Auction {auction_id} has gone ({e.status_code}), '
+                        'marking it final')
+                    self.writer.submit({'id': auction_id,
+                        'final_fetched_at': datetime.utcnow()},
+                        self.auction_table)
+                except Exception as e:
+                    exceptions.append(e)
+                    print(f'Error processing auction {auction_id}')
+                    print(traceback.format_exc())
+
+        auctions = self._collect_written(auctions, exceptions)
+        if exceptions:
+            raise Exception(exceptions)
+        return auctions
+
+    async def scrape_search_to_db_async(self, query_strings, n_results=None, \
+            save_page=False, save_images=False, concurrency=4, \
+            fetch_workers=None, parse_workers=None, write_workers=1, \
+            parse_queue_depth=32, write_queue_depth=32, skip_unchanged=True, \
+            refresh=None, profile_ttl=None):
+        """
+        Async variant of scrape_search_to_db, running auctions and profiles
+        through a pipeline of three stages joined by bounded queues:
+        fetch_workers fetch raw pages, keeping up to concurrency requests in
+        flight per host; parse_workers processes run the backend's
+        extractors on them; and write_workers threads save pages and images
+        and submit the models to the writer's thread, which writes them to
+        the database in batches.  parse_workers defaults to
+        the number of CPUs, and 0 parses on the fetch threads instead.
+        If skip_unchanged, pages whose digest matches the row they were last
+        parsed into go no further than the fetch stage.  If refresh is
+        given, only the results it finds due are scraped, and profiles
+        refreshed within profile_ttl aren't scraped again.
+        Returns a tuple ([BaseAuction], [BaseProfile])
+        """
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        if fetch_workers is None:
+            # Auctions and profiles may live on different hosts
+            fetch_workers = 2 * concurrency
+        if parse_workers is None:
+            parse_workers = os.cpu_count() or 1
+
+        loop = asyncio.get_event_loop()
+        self._host_concurrency = concurrency
+        self._host_semaphores = {}
+        self._async_executor = ThreadPoolExecutor(max_workers=fetch_workers)
+        db_executor = ThreadPoolExecutor(max_workers=write_workers)
+        if parse_workers:
+            # Spawned rather than forked, as the scraper holds running threads
+            parse_executor = ProcessPoolExecutor(max_workers=parse_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_parse_worker, initargs=(self,))
+        else:
+            parse_executor = None
+
+        # The fetch queue is unbounded, as the write stage feeds it profiles
+        fetch_queue = asyncio.Queue()
+        parse_queue = asyncio.Queue(maxsize=parse_queue_depth)
+        write_queue = asyncio.Queue(maxsize=write_queue_depth)
+
+        scraped_profile_ids = set()
+        n_profiles_queued = 0
+        auctions = []
+        profiles = []
+        exceptions = []
+
+        def failed(kind, uri, e):
+            exceptions.append(e)
+            print(f'Error processing {kind} {uri}')
+            print(''.join(traceback.format_exception(type(e), e,
+                e.__traceback__)))
+
+        def queue_profile(profile_id):
+            nonlocal n_profiles_queued
+            if profile_id is not None and \
+                    profile_id not in scraped_profile_ids:
+                scraped_profile_ids.add(profile_id)
+                n_profiles_queued += 1
+                fetch_queue.put_nowait(('profile',
+                    self.base_profile_uri.format(profile_id)))
+
+        async def fetch_stage():
+            while True:
+                kind, uri = await fetch_queue.get()
+                try:
+                    print('Scraping {} url {}'.format(kind, uri))
+                    fetch_page = getattr(self, f'_fetch_{kind}_page_async')
+                    raw = await fetch_page(uri)
+                    unchanged = await loop.run_in_executor(
+                        self._async_executor, self._find_unchanged, kind,
+                        raw) if skip_unchanged else None
+                    if unchanged is None:
+                        await parse_queue.put((kind, raw))
+                        continue
+
+                    print(f'{kind.capitalize()} {unchanged.id} is unchanged')
+                    self.circuit_breaker.record_success(
+                        urlparse(uri).netloc, 'blocked')
+                    await loop.run_in_executor(db_executor, self._touch,
+                        kind, unchanged.id)
+                    if kind == 'auction':
+                        queue_profile(unchanged.seller_id)
+                except Exception as e:
+                    failed(kind, uri, e)
+                finally:
+                    fetch_queue.task_done()
+
+        async def parse_stage():
+            while True:
+                kind, raw = await parse_queue.get()
+                host = urlparse(raw.uri).netloc
+                try:
+                    if parse_executor is not None:
+                        model = await loop.run_in_executor(parse_executor,
+                            _parse_in_worker, kind, raw)
+                    else:
+                        model = await loop.run_in_executor(
+                            self._async_executor, self._parse_page, kind, raw)
+                except UnexpectedPageError as e:
+                    self.circuit_breaker.record_failure(host, 'blocked')
+                    failed(kind, raw.uri, e)
+                except Exception as e:
+                    failed(kind, raw.uri, e)
+                else:
+                    self.circuit_breaker.record_success(host, 'blocked')
+                    await write_queue.put((kind, model, raw.content))
+                finally:
+                    parse_queue.task_done()
+
+        def write(kind, model, page):
+            if kind == 'auction':
+                self._save_auction(model, page, save_page, save_images)
+            else:
+                self._save_profile(model, page, save_page)
+            # Blocks while the writer's queue is full
+            return self.writer.submit(model)
+
+        async def write_stage():
+            while True:
+                kind, model, page = await write_queue.get()
+                try:
+                    future = await loop.run_in_executor(db_executor, write,
+                        kind, model, page)
+                    if kind == 'profile':
+                        profiles.append((kind, model, future))
+                        continue
+                    auctions.append((kind, model, future))
+                    queue_profile(model.seller_id)
+                except Exception as e:
+                    failed(kind, model.uri, e)
+                finally:
+                    write_queue.task_done()
+
+        workers = []
+        try:
+            results = await loop.run_in_executor(self._async_executor, \
+                self._scrape_searches, query_strings, n_results, save_page, \
+                save_images)
+            results = await loop.run_in_executor(self._async_executor, \
+                self._plan_refresh, results, refresh)
+            scraped_profile_ids.update(await loop.run_in_executor(
+                self._async_executor, self._fresh_profile_ids, profile_ttl))
+            for search in results.values():
+                fetch_queue.put_nowait(('auction', search.uri))
+
+            workers += [asyncio.ensure_future(fetch_stage()) \
+                for _ in range(fetch_workers)]
+            workers += [asyncio.ensure_future(parse_stage()) \
+                for _ in range(max(parse_workers, 1))]
+            workers += [asyncio.ensure_future(write_stage()) \
+                for _ in range(write_workers)]
+
+            # Writes may queue further profile fetches, so drain the stages
+            # until a pass queues none.  A fetch queued during the pass may
+            # already be taken from the queue, so the queue being empty
+            # doesn't mean it's done
+            while True:
+                n_queued = n_profiles_queued
+                await fetch_queue.join()
+                await parse_queue.join()
+                await write_queue.join()
+                if n_profiles_queued == n_queued:
+                    break
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            # Each run has its own executor and semaphores, so none are left
+            # shut down for the next
+            self._async_executor.shutdown(wait=True)
+            self._async_executor = None
+            self._host_semaphores = {}
+            db_executor.shutdown(wait=True)
+            if parse_executor is not None:
+                parse_executor.shutdown(wait=True)
+
+        # Waits on the writer's thread, off the event loop
+        auctions = await loop.run_in_executor(None, self._collect_written,
+            auctions, exceptions)
+        profiles = await loop.run_in_executor(None, self._collect_written,
+            profiles, exceptions)
+
         if exceptions:
             raise Exception(exceptions)
 
         return auctions, profiles
 
     def _scrape_auction_page(self, uri):
+        """
+        Returns the auction model scraped from uri, and the raw bytes of the
+        page, which are only written out if the page is saved
+        """
+        raw = self._fetch_auction_page(uri)
+        return self._parse_page('auction', raw), raw.content
+
+    def _fetch_auction_page(self, uri):
+        """
+        Returns the RawPage at uri, with any further documents that
+        _parse_auction_page needs in its extras
+        """
+        return self._get_raw_page(uri)
+
+    async def _fetch_auction_page_async(self, uri):
+        """
+        Async variant of _fetch_auction_page, for the async scrape.  By
+        default runs it whole on the scrape's thread pool; backends that
+        fetch further documents may fetch them concurrently instead
+        """
+        return await self._run_for_host(uri, self._fetch_auction_page, uri)
+
+    def _parse_auction_page(self, raw):
+        """
+        Returns the auction model extracted from the RawPage raw.  Runs in a
+        parse worker process, so must not make requests
+        """
         raise NotImplementedError('Subclass implements this')
 
     def _scrape_profile_page(self, uri):
+        """
+        Returns the profile model scraped from uri, and the raw bytes of the
+        page
+        """
+        raw = self._fetch_profile_page(uri)
+        return self._parse_page('profile', raw), raw.content
+
+    def _fetch_profile_page(self, uri):
+        """
+        Returns the RawPage at uri, with any further documents that
+        _parse_profile_page needs in its extras
+        """
+        return self._get_raw_page(uri)
+
+    async def _fetch_profile_page_async(self, uri):
+        """
+        Async variant of _fetch_profile_page, as for
+        _fetch_auction_page_async
+        """
+        return await self._run_for_host(uri, self._fetch_profile_page, uri)
+
+    def _parse_profile_page(self, raw):
+        """
+        Returns the profile model extracted from the RawPage raw.  Runs in a
+        parse worker process, so must not make requests
+        """
         raise NotImplementedError('Subclass implements this')
 
+    def _auction_digest(self, raw):
+        """
+        Returns a digest of the parts of the RawPage raw that the auction
+        is extracted from, which changes whenever the auction would.
+        Backends narrow it to the payload they parse, leaving out parts of
+        the page that change on every request.
+        """
+        return page_digest(raw.content, raw.extras)
+
+    def _profile_digest(self, raw):
+        """
+        Returns a digest of the parts of the RawPage raw that the profile
+        is extracted from, as for _auction_digest.
+        """
+        return page_digest(raw.content, raw.extras)
+
     def _generate_search_uri(self, query_string, n_page):
         """
         Returns a uri for the n_page page with the query_string parameter
@@ -450,6 +1398,18 @@ class AbstractAuctionScraper():
 
     def _scrape_search_page(self, uri):
         """
-        Returns a dict mapping unique auction IDs to auction search objects
+        Returns a dict mapping unique auction IDs to auction search objects,
+        the total number of results the page reports or None, and the raw
+        bytes of the page
+        """
+        raw = self._get_raw_page(uri)
+        results, total = self._parse_search_page(raw)
+        return results, total, raw.content
+
+    def _parse_search_page(self, raw):
+        """
+        Returns a tuple of a dict mapping unique auction IDs to auction
+        search objects, extracted from the RawPage raw, and the total number
+        of results the page reports, or None if the backend doesn't expose it
         """
         raise NotImplementedError('Subclass implements this')
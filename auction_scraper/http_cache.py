@@ -0,0 +1,213 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+An on-disk HTTP cache with conditional revalidation and LRU eviction
+"""
+
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+import json
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Stored bodies are already decoded, so these no longer describe them
+_UNCACHED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding',
+    'connection', 'keep-alive')
+
+def build_response(url, status_code, headers, content):
+    """
+    Builds a requests.Response from a body that has already been read.
+    """
+    r = requests.Response()
+    r.url = url
+    r.status_code = status_code
+    r.headers = CaseInsensitiveDict(headers)
+    r._content = content
+    r.encoding = get_encoding_from_headers(r.headers)
+    return r
+
+def _parse_cache_control(value):
+    directives = {}
+    for directive in filter(None, (d.strip() for d in value.split(','))):
+        k, _, v = directive.partition('=')
+        directives[k.strip().lower()] = v.strip().strip('"')
+    return directives
+
+def _expiry(headers, now):
+    """
+    Returns the time until which a response with headers may be served
+    without revalidation, or None if it must not be stored at all.
+    """
+    cache_control = _parse_cache_control(headers.get('Cache-Control', ''))
+    if 'no-store' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return now
+
+    for directive in ('s-maxage', 'max-age'):
+        try:
+            return now + int(cache_control[directive])
+        except (KeyError, ValueError):
+            pass
+
+    try:
+        return parsedate_to_datetime(headers['Expires']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    # Without freshness information, the response is only worth keeping
+    # if it can be cheaply revalidated
+    if 'ETag' in headers or 'Last-Modified' in headers:
+        return now
+    return None
+
+CacheEntry = namedtuple('CacheEntry', ['url', 'status_code', 'headers',
+    'content', 'etag', 'last_modified', 'expires'])
+
+class HTTPCache():
+    """
+    A SQLite-backed cache of GET responses keyed by url, holding up to
+    max_size bytes of bodies and evicting the least recently used first.
+    Counts hits, revalidations (304s) and misses.
+    """
+    def __init__(self, path, max_size=256 * 1024 * 1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), timeout=20,
+            check_same_thread=False)
+        with self._connection as c:
+            c.execute('CREATE TABLE IF NOT EXISTS http_cache '
+                '(url TEXT PRIMARY KEY, status_code INTEGER NOT NULL, '
+                'headers TEXT NOT NULL, content BLOB NOT NULL, etag TEXT, '
+                'last_modified TEXT, expires REAL NOT NULL, '
+                'size INTEGER NOT NULL, accessed REAL NOT NULL)')
+            c.execute('CREATE INDEX IF NOT EXISTS ix_http_cache_accessed '
+                'ON http_cache (accessed)')
+            self._size = c.execute('SELECT COALESCE(SUM(size), 0) '
+                'FROM http_cache').fetchone()[0]
+
+    def get(self, url):
+        """
+        Returns the CacheEntry for url, or None if it isn't cached.
+        """
+        with self._lock, self._connection as c:
+            row = c.execute('SELECT url, status_code, headers, content, etag, '
+                'last_modified, expires FROM http_cache WHERE url = ?',
+                (url,)).fetchone()
+            if row is None:
+                return None
+            c.execute('UPDATE http_cache SET accessed = ? WHERE url = ?',
+                (time.time(), url))
+        entry = CacheEntry(*row)
+        return entry._replace(headers=json.loads(entry.headers))
+
+    def store(self, url, response):
+        """
+        Stores response for url if its headers allow it.
+        """
+        now = time.time()
+        expires = _expiry(response.headers, now)
+        if expires is None:
+            return
+
+        headers = {k: v for k, v in response.headers.items() \
+            if k.lower() not in _UNCACHED_HEADERS}
+        content = response.content
+        with self._lock, self._connection as c:
+            old = c.execute('SELECT size FROM http_cache WHERE url = ?',
+                (url,)).fetchone()
+            c.execute('INSERT OR REPLACE INTO http_cache (url, status_code, '
+                'headers, content, etag, last_modified, expires, size, '
+                'accessed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, response.status_code, json.dumps(headers), content,
+                    response.headers.get('ETag'),
+                    response.headers.get('Last-Modified'), expires,
+                    len(content), now))
+            self._size += len(content) - (old[0] if old else 0)
+            self._evict(c)
+
+    def refresh(self, url, response):
+        """
+        Renews the freshness of url's entry from a 304 response.
+        """
+        now = time.time()
+        expires = _expiry(response.headers, now)
+        with self._lock, self._connection as c:
+            c.execute('UPDATE http_cache SET expires = ?, accessed = ? '
+                'WHERE url = ?', (now if expires is None else expires, now,
+                    url))
+
+    def _evict(self, c):
+        while self._size > self.max_size:
+            rows = c.execute('SELECT url, size FROM http_cache '
+                'ORDER BY accessed LIMIT 64').fetchall()
+            if not rows:
+                break
+            for url, size in rows:
+                c.execute('DELETE FROM http_cache WHERE url = ?', (url,))
+                self._size -= size
+                if self._size <= self.max_size:
+                    break
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def fetch(self, send, url):
+        """
+        Returns the response for url, from the cache where it is fresh.
+        Otherwise send(url, headers) is called to request it, conditionally
+        if a cached entry can be revalidated.
+        """
+        entry = self.get(url)
+        if entry is not None and entry.expires > time.time():
+            self._count('hits')
+            return build_response(url, entry.status_code, entry.headers,
+                entry.content)
+
+        headers = {}
+        if entry is not None:
+            if entry.etag is not None:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified is not None:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        r = send(url, headers)
+        if r.status_code == 304 and entry is not None:
+            self._count('revalidations')
+            self.refresh(url, r)
+            return build_response(url, entry.status_code, entry.headers,
+                entry.content)
+
+        self._count('misses')
+        if r.ok:
+            self.store(url, r)
+        return r
+
+    def stats(self):
+        """
+        Returns a dict of the hit, revalidation and miss counts, and the
+        total size of cached bodies in bytes.
+        """
+        return {'hits': self.hits, 'revalidations': self.revalidations,
+            'misses': self.misses, 'size': self._size}
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,45 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Pooled keep-alive HTTP sessions shared by every fetch a scraper makes
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+
+# urllib3 advertises br only when a brotli decoder is importable
+DEFAULT_HEADERS = {
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Connection': 'keep-alive',
+}
+
+def create_http_session(pool_connections=10, pool_maxsize=10,
+        pool_block=False, headers=None):
+    """
+    Returns a requests.Session whose http and https adapters keep up to
+    pool_maxsize keep-alive connections open per host, for up to
+    pool_connections distinct hosts.
+    If pool_block, requests wait for a free connection instead of opening
+    a throwaway one once a host's pool is exhausted.
+    headers are sent with every request, on top of DEFAULT_HEADERS.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize, pool_block=pool_block)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    session.headers.update(DEFAULT_HEADERS)
+    if headers is not None:
+        session.headers.update(headers)
+    return session
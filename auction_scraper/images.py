@@ -0,0 +1,119 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+A parallel, streaming image downloader
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from termcolor import colored
+from urllib.parse import urlparse
+import hashlib
+import os
+import tempfile
+import threading
+
+# An image on disk, with the SHA-256 of its content in hex and its size
+DownloadedImage = namedtuple('DownloadedImage',
+    ('path', 'content_hash', 'byte_size'))
+
+def image_file_name(backend_name, auction_id, url):
+    """
+    Returns the name an image of an auction is saved under.
+    """
+    return f'{backend_name}_{auction_id}_' + \
+        '_'.join(urlparse(url).path.split('/'))
+
+class ImageDownloader():
+    """
+    Downloads images on a bounded pool of worker threads, streaming each
+    body to a temporary file that is atomically renamed into place.
+    Each url is downloaded at most once per downloader, however many
+    auctions reference it.
+    fetch is a callable (uri, **kwargs) -> requests.Response.
+    """
+    def __init__(self, fetch, max_workers=4, chunk_size=64 * 1024):
+        self._fetch = fetch
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _hash_file(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                digest.update(chunk)
+        return DownloadedImage(path, digest.hexdigest(), path.stat().st_size)
+
+    def _download(self, url, path):
+        if path.is_file():
+            return self._hash_file(path)
+
+        with self._fetch(url, stream=True) as r:
+            if not r.ok:
+                print(colored('Could not find page: {}'.format(url), 'red'))
+                return None
+
+            # Hashed as it streams, rather than read back
+            digest = hashlib.sha256()
+            byte_size = 0
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent,
+                prefix='.' + path.name, suffix='.part')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=self.chunk_size):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        byte_size += len(chunk)
+                os.replace(tmp_path, path)
+            except BaseException as e:
+                os.unlink(tmp_path)
+                raise e
+        return DownloadedImage(path, digest.hexdigest(), byte_size)
+
+    def submit(self, url, path):
+        """
+        Queues url to be downloaded to path, returning a Future of the
+        DownloadedImage written, or of None if the download failed.  If url is already
+        queued or downloaded, returns the existing Future instead.
+        """
+        with self._lock:
+            try:
+                return self._futures[url]
+            except KeyError:
+                future = self._executor.submit(self._download, url, path)
+                self._futures[url] = future
+                return future
+
+    def download(self, urls_and_paths):
+        """
+        Downloads each (url, path) pair, returning a DownloadedImage for
+        each, in order, or None for those that couldn't be downloaded.
+        """
+        urls_and_paths = list(urls_and_paths)
+        futures = [self.submit(url, path) for url, path in urls_and_paths]
+        images = []
+        for (url, _), future in zip(urls_and_paths, futures):
+            try:
+                images.append(future.result())
+            except Exception as e:
+                print(colored('Could not download image {}: {}' \
+                    .format(url, e), 'red'))
+                images.append(None)
+        return images
+
+    def close(self):
+        """
+        Waits for queued downloads and stops the worker threads.
+        """
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,261 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Versioned upgrades of the schema of existing databases, for the changes
+that Base.metadata.create_all doesn't make to tables that already exist
+"""
+
+from pathlib import Path
+
+from sqlalchemy import MetaData, Table, Column, Integer, inspect, select, text
+
+from auction_scraper.abstract_models import Base, BaseAuction
+from auction_scraper.images import image_file_name
+from auction_scraper.prices import minor_units
+
+# Kept apart from Base, so its absence marks a database from before
+# migrations
+_schema_metadata = MetaData()
+schema_version = Table('schema_version', _schema_metadata,
+    Column('version', Integer, nullable=False))
+
+def create_declared_indexes(connection):
+    """
+    Creates each index declared on the models that is missing from the
+    database, skipping those on columns the database doesn't have yet.
+    """
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {i['name'] for i in inspector.get_indexes(table.name)}
+        columns = {c['name'] for c in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if index.name not in existing and \
+                    all(c.name in columns for c in index.columns):
+                index.create(connection)
+
+def add_declared_columns(connection):
+    """
+    Adds each nullable column declared on the models that is missing from
+    the database, then creates any missing indexes.
+    """
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN '
+                f'"{column.name}" {column.type.compile(connection.dialect)}'))
+    create_declared_indexes(connection)
+
+def _auction_models():
+    return [m.class_ for m in Base.registry.mappers \
+        if issubclass(m.class_, BaseAuction)]
+
+def rebuild_table(connection, table):
+    """
+    Recreates table as the model declares it, copying over the columns the
+    old and new tables share.  Used for changes SQLite can't make with
+    ALTER TABLE.
+    """
+    old_columns = {c['name'] for c in \
+        inspect(connection).get_columns(table.name)}
+    columns = ', '.join(f'"{c.name}"' for c in table.columns \
+        if c.name in old_columns)
+
+    # Copied with the tables it references, so its foreign keys resolve.
+    # Its indexes are created once it has been renamed, under their names
+    metadata = MetaData()
+    for t in Base.metadata.sorted_tables:
+        t.to_metadata(metadata)
+    new_name = f'_new_{table.name}'
+    new_table = table.to_metadata(metadata, name=new_name)
+    new_table.indexes.clear()
+    new_table.create(connection)
+    connection.execute(text(f'INSERT INTO "{new_name}" ({columns}) '
+        f'SELECT {columns} FROM "{table.name}"'))
+
+    # Renamed after the old table is dropped, so that the foreign keys of
+    # other tables keep referencing it by name
+    connection.execute(text(f'DROP TABLE "{table.name}"'))
+    connection.execute(text(f'ALTER TABLE "{new_name}" '
+        f'RENAME TO "{table.name}"'))
+    for index in table.indexes:
+        index.create(connection)
+
+def drop_columns(connection, table, columns):
+    """
+    Drops columns that the model of table no longer declares.
+    """
+    if connection.dialect.name == 'sqlite':
+        rebuild_table(connection, table)
+        return
+    for column in columns:
+        connection.execute(text(f'ALTER TABLE "{table.name}" '
+            f'DROP COLUMN "{column}"'))
+
+# From https://stackoverflow.com/questions/18092354/python-split-string-without-splitting-escaped-character#21107911
+def _escape_split(s, delim):
+    i, res, buf = 0, [], ''
+    while True:
+        j, e = s.find(delim, i), 0
+        if j < 0:  # end reached
+            return res + [buf + s[i:]]  # add remainder
+        while j - e and s[j - e - 1] == '\\':
+            e += 1  # number of escapes
+        d = e // 2  # number of double escapes
+        if e != d * 2:  # odd number of escapes
+            buf += s[i:j - d - 1] + s[j]  # add the escaped char
+            i = j + 1  # and skip it
+            continue  # add more to buf
+        res.append(buf + s[i:j - d])
+        i, buf = j + len(delim), ''  # start after delim
+
+def move_images_to_tables(connection):
+    """
+    Moves the space-separated image_urls and colon-separated image_paths of
+    each auction into rows of the backend's auction images table, then
+    drops the two columns.
+    """
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for auction in _auction_models():
+        table = auction.__table__
+        if table.name not in tables or 'image_urls' not in \
+                {c['name'] for c in inspector.get_columns(table.name)}:
+            continue
+        image_table = auction.images.property.mapper.local_table
+        # Tables are named after their backend, as are the images saved
+        backend_name = table.name[:-len('_auctions')]
+
+        old = Table(table.name, MetaData(), autoload_with=connection)
+        rows = []
+        for auction_id, image_urls, image_paths in connection.execute(
+                select(old.c.id, old.c.image_urls, old.c.image_paths)):
+            paths = {Path(p).name: p for p in \
+                _escape_split(image_paths or '', ':') if p}
+            urls = dict.fromkeys(filter(None, (image_urls or '').split(' ')))
+            for position, url in enumerate(urls):
+                name = image_file_name(backend_name, auction_id, url)
+                rows.append({'auction_id': auction_id, 'url': url,
+                    'position': position, 'path': paths.get(name)})
+            if len(rows) >= 10000:
+                connection.execute(image_table.insert(), rows)
+                rows = []
+        if rows:
+            connection.execute(image_table.insert(), rows)
+
+        drop_columns(connection, table, ('image_urls', 'image_paths'))
+
+def convert_prices(connection):
+    """
+    Converts the prices of each auction, stored as strings or numbers of
+    major units with -1 for those missing, into integers of minor units
+    with NULL for those missing, then creates their indexes.
+    """
+    # Converted by SQLite as it updates each row, rather than read out and
+    # written back
+    connection.connection.create_function('minor_units', 2, minor_units)
+
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for auction in _auction_models():
+        table = auction.__table__
+        if table.name not in tables:
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        columns = [c.name for c in table.columns \
+            if c.info.get('minor_units') and c.name in existing]
+
+        # Updated as text, leaving date_modified as it was
+        if columns:
+            connection.execute(text(f'UPDATE "{table.name}" SET ' +
+                ', '.join(f'"{c}" = minor_units("{c}", currency)' \
+                    for c in columns)))
+        # Indexed once the prices are copied, as integers, into the columns
+        # of their new type
+        rebuild_table(connection, table)
+    create_declared_indexes(connection)
+
+# (version, description, function of a connection), in order.  Each runs
+# in its own transaction, with the version recorded when it commits
+MIGRATIONS = [
+    (1, 'Index the seller, winner, end time, currency and modification '
+        'time of auctions', create_declared_indexes),
+    (2, 'Move auction images into their own tables', move_images_to_tables),
+    (3, 'Record the digest of the page each auction and profile was parsed '
+        'from, and when it was last seen', add_declared_columns),
+    (4, 'Record when each auction was scraped after it closed',
+        add_declared_columns),
+    (5, 'Store prices as integers of minor units, and index them',
+        convert_prices),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(connection):
+    """
+    Returns the version of the schema of the database, or None if it
+    predates migrations.
+    """
+    if not inspect(connection).has_table(schema_version.name):
+        return None
+    return connection.execute(schema_version.select()).scalar()
+
+def _set_schema_version(connection, version):
+    connection.execute(schema_version.delete())
+    connection.execute(schema_version.insert().values(version=version))
+
+def _load_models():
+    # Every backend's tables are upgraded, whichever backend opens the
+    # database.  Imported here, as the backends import the scraper
+    import auction_scraper.scrapers.catawiki.models
+    import auction_scraper.scrapers.ebay.models
+    import auction_scraper.scrapers.liveauctioneers.models
+
+def upgrade_schema(engine, verbose=False):
+    """
+    Creates any missing tables, then runs each migration newer than the
+    database's schema version.  New databases are created at the latest
+    version.
+    Returns the list of versions migrated to.
+    """
+    _load_models()
+    with engine.connect() as connection:
+        new = not set(inspect(connection).get_table_names()) & \
+            set(Base.metadata.tables)
+        version = get_schema_version(connection)
+
+    Base.metadata.create_all(engine)
+    _schema_metadata.create_all(engine)
+    if version is None:
+        version = SCHEMA_VERSION if new else 0
+        with engine.begin() as connection:
+            _set_schema_version(connection, version)
+
+    migrated = []
+    for v, description, migrate in MIGRATIONS:
+        if v <= version:
+            continue
+        if verbose:
+            print(f'Migrating the database to version {v}: {description}')
+        with engine.begin() as connection:
+            migrate(connection)
+            _set_schema_version(connection, v)
+        migrated.append(v)
+    return migrated
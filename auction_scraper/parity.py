@@ -0,0 +1,91 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Checks that a backend's extractors give the same fields under different
+HTML parsers, using pages saved with --save-pages
+"""
+
+from pathlib import Path
+from sqlalchemy import inspect
+
+from auction_scraper.http_cache import build_response
+
+# Columns stamped on every parse rather than extracted from the page
+_UNPARSED_COLUMNS = ('last_seen', 'content_digest')
+
+def _page_id(path):
+    # Saved pages are named e.g. auction-{id}.html or profile-{id}.html
+    return Path(path).stem.split('-', 1)[1]
+
+def _scrape_saved_page(scraper, kind, path, parser):
+    """
+    Scrapes the page saved at path as if it had been fetched, with every
+    other request (APIs, iframes) answered as not found.
+    Returns a dict of the resulting model's column values, other than those
+    set on every parse.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    if kind == 'auction':
+        uri = scraper.base_auction_uri.format(_page_id(path))
+        scrape_page = scraper._scrape_auction_page
+    elif kind == 'profile':
+        uri = scraper.base_profile_uri.format(_page_id(path))
+        scrape_page = scraper._scrape_profile_page
+    else:
+        raise ValueError('kind must be auction or profile')
+
+    def fetch(u, **_):
+        if u == uri:
+            return build_response(u, 200, {}, content)
+        return build_response(u, 404, {}, b'')
+
+    old_parser = scraper.parser
+    scraper.parser = parser
+    scraper._fetch = fetch
+    try:
+        model, _ = scrape_page(uri)
+    finally:
+        del scraper._fetch
+        scraper.parser = old_parser
+
+    return {a.key: getattr(model, a.key) \
+        for a in inspect(model).mapper.column_attrs \
+        if a.key not in _UNPARSED_COLUMNS}
+
+def parser_parity(scraper, kind, paths, parsers=('html.parser', 'lxml')):
+    """
+    Scrapes each saved page in paths with every parser in parsers.
+    Returns a list of (path, field, {parser: value}) for each field that
+    differs between parsers, or (path, None, {parser: exception}) for a
+    page that some parsers couldn't scrape.
+    """
+    differences = []
+    for path in paths:
+        fields, errors = {}, {}
+        for parser in parsers:
+            try:
+                fields[parser] = _scrape_saved_page(scraper, kind, path, parser)
+            except Exception as e:
+                errors[parser] = e
+
+        if errors:
+            differences.append((path, None, errors))
+            continue
+
+        reference = fields[parsers[0]]
+        for field in reference:
+            values = {p: fields[p][field] for p in parsers}
+            if any(v != reference[field] for v in values.values()):
+                differences.append((path, field, values))
+    return differences
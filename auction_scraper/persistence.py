@@ -0,0 +1,333 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Writing of scraped models to the database from a single thread, in
+batches of native upserts
+"""
+
+from concurrent.futures import Future
+from datetime import datetime
+import queue
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import inspect, and_, not_, select, func, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.interfaces import ONETOMANY
+
+from auction_scraper.storage import SQLITE_MAX_VARIABLES
+
+# Columns left as first written when a row is updated
+_INSERT_ONLY_COLUMNS = ('date_created',)
+
+def _supports_upsert(engine):
+    if engine.dialect.name == 'postgresql':
+        return True
+    # ON CONFLICT DO UPDATE arrived in SQLite 3.24
+    return engine.dialect.name == 'sqlite' and \
+        sqlite3.sqlite_version_info >= (3, 24)
+
+def _rows(model):
+    """
+    Returns a list of (table, dict of the column values that have been
+    set) for model, followed by those of the children, such as images, set
+    on its one-to-many relationships.  Unset columns are left to their
+    defaults on insert, and untouched on update, except date_modified.
+    """
+    state = inspect(model)
+    row = {}
+    for attr in state.mapper.column_attrs:
+        if attr.key in state.dict:
+            row[attr.columns[0].name] = state.dict[attr.key]
+    table = state.mapper.local_table
+    if 'date_modified' in table.columns:
+        row['date_modified'] = datetime.utcnow()
+    rows = [(table, row)]
+
+    for relationship in state.mapper.relationships:
+        if relationship.direction is not ONETOMANY or \
+                relationship.key not in state.dict:
+            continue
+        for child in state.dict[relationship.key]:
+            child_rows = _rows(child)
+            # Foreign keys are only set from the parent on a session flush
+            for parent, column in relationship.local_remote_pairs:
+                child_rows[0][1][column.name] = row[parent.name]
+            rows += child_rows
+    return rows
+
+def _replaced(model):
+    """
+    Returns a list of (table, dict of the parent's foreign key values, set
+    of child keys) for each delete-orphan one-to-many relationship set on
+    model, such as images, whose children replace those stored before.
+    Child keys are the values of the children's primary key columns, other
+    than the foreign key.
+    """
+    state = inspect(model)
+    replaced = []
+    for relationship in state.mapper.relationships:
+        if relationship.direction is not ONETOMANY or \
+                relationship.key not in state.dict:
+            continue
+        children = state.dict[relationship.key]
+        if relationship.cascade.delete_orphan:
+            table = relationship.mapper.local_table
+            parent = {column.name: state.dict[local.key] for local, column \
+                in relationship.local_remote_pairs}
+            key = [c.name for c in table.primary_key if c.name not in parent]
+            replaced.append((table, parent, {tuple(inspect(child).dict[k] \
+                for k in key) for child in children}))
+        for child in children:
+            replaced += _replaced(child)
+    return replaced
+
+def _upsert(connection, insert, table, columns, rows):
+    statement = insert(table).values(rows)
+    primary_key = [c.name for c in table.primary_key]
+    update = {c: statement.excluded[c] for c in columns \
+        if c not in primary_key and c not in _INSERT_ONLY_COLUMNS}
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=primary_key, set_=update))
+
+def _update_or_insert(connection, table, row):
+    primary_key = and_(*(c == row[c.name] for c in table.primary_key))
+    update = {k: v for k, v in row.items() if k not in _INSERT_ONLY_COLUMNS}
+    if connection.execute(table.update().where(primary_key) \
+            .values(update)).rowcount == 0:
+        connection.execute(table.insert().values(row))
+
+def _changed_rows(connection, table, rows):
+    """
+    Returns those of rows of table, a time series whose info names its
+    (key, time) columns as 'series', whose other values differ from the row
+    of the same key before them, whether in rows or the latest in the
+    database.
+    """
+    key, time = table.info['series']
+    values = [c.name for c in table.columns if c.name not in (key, time)]
+    # Keys compared as the column stores them, as a backend may give ids of
+    # another type, such as eBay's ints
+    as_key = table.c[key].type.python_type
+    rows = sorted(rows, key=lambda row: (as_key(row[key]), row[time]))
+    keys = list(dict.fromkeys(as_key(row[key]) for row in rows))
+
+    previous = {}
+    for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+        latest = select(table.c[key], func.max(table.c[time]).label('time')) \
+            .where(table.c[key].in_(keys[i:i + SQLITE_MAX_VARIABLES])) \
+            .group_by(table.c[key]).subquery()
+        for row in connection.execute(select(table).join(latest,
+                and_(table.c[key] == latest.c[key],
+                    table.c[time] == latest.c.time))):
+            row = row._mapping
+            previous[row[key]] = tuple(row[v] for v in values)
+
+    changed = []
+    for row in rows:
+        current = tuple(row.get(v) for v in values)
+        if previous.get(as_key(row[key])) != current:
+            changed.append(row)
+            previous[as_key(row[key])] = current
+    return changed
+
+def _delete_replaced(connection, table, parent, keys):
+    key = [c for c in table.primary_key if c.name not in parent]
+    statement = table.delete().where(
+        and_(*(table.c[k] == v for k, v in parent.items())))
+    if keys:
+        statement = statement.where(not_(tuple_(*key).in_(list(keys))))
+    connection.execute(statement)
+
+def write_rows(engine, rows, replaced=()):
+    """
+    Writes rows, a list of (table, dict of column values), in one
+    transaction, with an INSERT ... ON CONFLICT DO UPDATE per table and set
+    of columns.  Only the columns in each dict are updated.  Dialects
+    without native upserts update, then insert, each row.  Rows of time
+    series tables, such as auction snapshots, are only written where they
+    differ from the row before them.
+    Then, for each (table, parent foreign key values, child keys) of
+    replaced, as returned by _replaced, deletes the parent's other rows of
+    table.  Where a parent is replaced more than once, the last wins.
+    """
+    # Group rows by table and set of columns, as each statement takes rows
+    # of one shape.  A row written twice keeps its last values
+    groups = {}
+    for table, row in rows:
+        row = dict(row)
+        by_key = groups.setdefault(table, {})
+        key = tuple(row[c.name] for c in table.primary_key)
+        if key in by_key:
+            by_key[key].update(row)
+        else:
+            by_key[key] = row
+    children = {}
+    for table, parent, keys in replaced:
+        children[(table, tuple(sorted(parent.items())))] = keys
+    if not groups and not children:
+        return
+
+    upsert = _supports_upsert(engine)
+    insert = postgresql.insert if engine.dialect.name == 'postgresql' \
+        else sqlite.insert
+    metadata = next(iter(groups or (t for t, _ in children))).metadata
+    order = {t: i for i, t in enumerate(metadata.sorted_tables)}
+    with engine.begin() as connection:
+        # Profiles are written before the auctions referencing them
+        for table in sorted(groups, key=lambda t: order.get(t, 0)):
+            table_rows = list(groups[table].values())
+            if 'series' in table.info:
+                table_rows = _changed_rows(connection, table, table_rows)
+            if not upsert:
+                for row in table_rows:
+                    _update_or_insert(connection, table, row)
+                continue
+
+            shapes = {}
+            for row in table_rows:
+                shapes.setdefault(tuple(sorted(row)), []).append(row)
+            for columns, shape_rows in shapes.items():
+                # Defaults fill unset columns, adding to the parameters
+                chunk = max(1, SQLITE_MAX_VARIABLES // len(table.columns))
+                for i in range(0, len(shape_rows), chunk):
+                    _upsert(connection, insert, table, columns,
+                        shape_rows[i:i + chunk])
+
+        # Once the new children are written, so the last set of each wins
+        for (table, parent), keys in children.items():
+            _delete_replaced(connection, table, dict(parent), keys)
+
+# Queued by flush and close, which wait on the future paired with it
+_FLUSH = object()
+_STOP = object()
+
+class PersistenceService():
+    """
+    Owns writing to the database, from a single thread.  Auction and
+    profile models, or dicts of column values for a table, are submitted to
+    a queue of up to queue_size items; submit blocks while the queue is
+    full.  The thread writes them with write_rows in batches of up to
+    batch_size, or after max_delay seconds, whichever comes first.
+    Each submission returns a Future, resolved once its item is committed,
+    or failed with the error that stopped it being written.
+    """
+    def __init__(self, engine, batch_size=100, max_delay=5, queue_size=1000):
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        self.engine = engine
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+            name='persistence', daemon=True)
+        self._thread.start()
+
+    def submit(self, item, table=None):
+        """
+        Queues item to be written: a model, or a dict of column values for
+        table, a Table or model class.  Models are stamped with
+        date_modified; dicts are written as given.
+        Returns a Future resolved to item once it has been written.
+        """
+        if self._closed:
+            raise ValueError('The persistence service is closed')
+        if isinstance(item, dict):
+            if table is None:
+                raise ValueError('A table is required to write a dict')
+            rows = [(getattr(table, '__table__', table), item)]
+            replaced = []
+        else:
+            rows = _rows(item)
+            replaced = _replaced(item)
+
+        future = Future()
+        self._queue.put((future, item, (rows, replaced)))
+        return future
+
+    def write(self, item, table=None):
+        """
+        Writes item, after anything already queued, waiting until it's
+        written.  Raises the error that stopped it being written.
+        """
+        future = self.submit(item, table)
+        self.flush()
+        return future.result()
+
+    def flush(self):
+        """
+        Waits until everything already queued has been written.
+        """
+        future = Future()
+        self._queue.put((future, _FLUSH, None))
+        future.result()
+
+    def close(self):
+        """
+        Writes everything queued, then stops the writing thread.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        future = Future()
+        self._queue.put((future, _STOP, None))
+        future.result()
+        self._thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None \
+                else max(0, deadline - time.monotonic())
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                entry = None
+            control = entry is not None and \
+                (entry[1] is _FLUSH or entry[1] is _STOP)
+
+            if entry is not None and not control:
+                batch.append(entry)
+                if deadline is None and self.max_delay is not None:
+                    deadline = time.monotonic() + self.max_delay
+                if len(batch) < self.batch_size:
+                    continue
+
+            if batch:
+                self._write(batch)
+                batch = []
+            deadline = None
+            if control:
+                entry[0].set_result(None)
+                if entry[1] is _STOP:
+                    return
+
+    def _write(self, batch):
+        try:
+            write_rows(self.engine,
+                [row for _, _, (rows, _) in batch for row in rows],
+                [r for _, _, (_, replaced) in batch for r in replaced])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][0].set_exception(e)
+                return
+        else:
+            for future, item, _ in batch:
+                future.set_result(item)
+            return
+
+        # Write each item alone, to find those that failed
+        for entry in batch:
+            self._write([entry])
@@ -0,0 +1,69 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Prices as exact integers of a currency's minor units, and the history of
+auctions' prices
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+
+from babel.numbers import get_currency_precision
+from sqlalchemy import select
+
+from auction_scraper.storage import SQLITE_MAX_VARIABLES
+
+def minor_units(price, currency=None):
+    """
+    Returns price, a number or numeric string in the major units of
+    currency, as an int of its minor units, such as cents.  Currencies
+    default to two decimal places.
+    Returns None if price is missing, not a number, or a negative sentinel
+    """
+    if price is None:
+        return None
+    try:
+        amount = Decimal(str(price).strip())
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount < 0:
+        return None
+
+    code = getattr(currency, 'code', currency)
+    places = _places(str(code)) if code else 2
+    return int((amount * 10 ** places).to_integral_value(ROUND_HALF_UP))
+
+@lru_cache(maxsize=None)
+def _places(code):
+    return get_currency_precision(code)
+
+def price_history(connection, snapshot_table, auction_ids, since=None):
+    """
+    Reads the snapshots of each of auction_ids from snapshot_table, a
+    BaseAuctionSnapshot model, observed at or after since if given.
+    Returns a dict {auction_id: [snapshot row]}, each list in order of
+    observation, with rows of (observed_at, price_minor, n_bids, flags)
+    """
+    auction_ids = list(dict.fromkeys(auction_ids))
+    history = {auction_id: [] for auction_id in auction_ids}
+    for i in range(0, len(auction_ids), SQLITE_MAX_VARIABLES):
+        query = select(snapshot_table.auction_id,
+                snapshot_table.observed_at, snapshot_table.price_minor,
+                snapshot_table.n_bids, snapshot_table.flags) \
+            .where(snapshot_table.auction_id.in_(
+                auction_ids[i:i + SQLITE_MAX_VARIABLES])) \
+            .order_by(snapshot_table.auction_id, snapshot_table.observed_at)
+        if since is not None:
+            query = query.where(snapshot_table.observed_at >= since)
+        for auction_id, *snapshot in connection.execute(query):
+            history[auction_id].append(tuple(snapshot))
+    return history
@@ -0,0 +1,159 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Per-host token bucket rate limiting, shared across threads and optionally
+processes
+"""
+
+from urllib.parse import urlparse
+import sqlite3
+import threading
+import time
+
+class TokenBucket():
+    """
+    A bucket holding up to capacity tokens, refilled at rate tokens per
+    second.  Each request takes one token, waiting for it if the bucket is
+    empty.  Tokens are reserved under a lock, so concurrent callers queue
+    fairly instead of all waking at once.
+    """
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError('rate must be greater than 0')
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._timestamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """
+        Takes a token, returning the time in seconds until it is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                self._tokens + (now - self._timestamp) * self.rate)
+            self._timestamp = now
+            self._tokens -= 1
+            return max(0, -self._tokens / self.rate)
+
+    def acquire(self):
+        """
+        Blocks until a token is available, returning the time waited.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+class SQLiteTokenBucket(TokenBucket):
+    """
+    A TokenBucket whose state lives in a SQLite database, so that every
+    scraper process on the machine using the same path and key draws from
+    one budget.
+    """
+    def __init__(self, path, key, rate, capacity=1):
+        super().__init__(rate, capacity)
+        self.key = key
+        self._connection = sqlite3.connect(str(path), timeout=20,
+            isolation_level=None, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS token_buckets '
+            '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+            'timestamp REAL NOT NULL)')
+
+    def _reserve(self):
+        # Wall-clock time, since monotonic clocks aren't shared by processes
+        with self._lock:
+            c = self._connection
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                row = c.execute('SELECT tokens, timestamp FROM token_buckets '
+                    'WHERE key = ?', (self.key,)).fetchone()
+                if row is None:
+                    tokens = self.capacity
+                else:
+                    tokens = min(self.capacity,
+                        row[0] + max(0, now - row[1]) * self.rate)
+                tokens -= 1
+                c.execute('INSERT OR REPLACE INTO token_buckets '
+                    '(key, tokens, timestamp) VALUES (?, ?, ?)',
+                    (self.key, tokens, now))
+                c.execute('COMMIT')
+            except Exception as e:
+                c.execute('ROLLBACK')
+                raise e
+            return max(0, -tokens / self.rate)
+
+class RateLimiter():
+    """
+    Maps hosts onto token buckets.
+    limits is a dict {host: (rate, capacity)}.  A host starting with '.'
+    matches every subdomain of it, with exact matches taking precedence
+    over the longest matching suffix.  Hosts matching no entry use default,
+    or are unlimited if default is None.
+    If shared_path is given, buckets are kept in the SQLite database at
+    that path so that several processes share one budget per host.
+    """
+    def __init__(self, limits=None, default=None, shared_path=None):
+        self.limits = dict(limits or {})
+        self.default = default
+        self.shared_path = shared_path
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _limit_key(self, host):
+        if host in self.limits:
+            return host
+        suffixes = [k for k in self.limits \
+            if k.startswith('.') and ('.' + host).endswith(k)]
+        if suffixes:
+            return max(suffixes, key=len)
+        return None
+
+    def bucket(self, host):
+        """
+        Returns the TokenBucket governing host, or None if it is unlimited.
+        """
+        key = self._limit_key(host)
+        if key is None:
+            if self.default is None:
+                return None
+            # Each host gets its own bucket at the default rate
+            key, limit = host, self.default
+        else:
+            limit = self.limits[key]
+
+        with self._lock:
+            try:
+                return self._buckets[key]
+            except KeyError:
+                rate, capacity = limit
+                if self.shared_path is not None:
+                    bucket = SQLiteTokenBucket(self.shared_path, key, rate,
+                        capacity)
+                else:
+                    bucket = TokenBucket(rate, capacity)
+                self._buckets[key] = bucket
+                return bucket
+
+    def acquire(self, uri):
+        """
+        Blocks until a request to uri is allowed, returning the time waited.
+        """
+        bucket = self.bucket(urlparse(uri).netloc)
+        if bucket is None:
+            return 0
+        return bucket.acquire()
@@ -0,0 +1,162 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Retry with backoff, and per-host circuit breaking, for the fetch layer
+"""
+
+from email.utils import parsedate_to_datetime
+import random
+import threading
+import time
+
+import requests
+
+class HTTPStatusError(ValueError):
+    """
+    Raised when a page is requested but the site responds with an error.
+    """
+    def __init__(self, uri, status_code):
+        self.uri = uri
+        self.status_code = status_code
+        self.message = 'The requested page could not be found'
+
+    def __str__(self):
+        return f'{self.message} ({self.status_code}): {self.uri}'
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a host keeps failing after repeated pauses, so no further
+    requests are sent to it.
+    """
+    def __init__(self, host):
+        self.host = host
+        self.message = f'Stopped sending requests to {host}, which appears to be blocking the scraper'
+
+    def __str__(self):
+        return f'{self.message}'
+
+class RetryPolicy():
+    """
+    Decides whether and when a failed request is retried.
+    Connection errors, timeouts and the statuses in retry_statuses are
+    transient, and retried up to max_retries times with exponential backoff
+    and jitter.  A Retry-After header is honoured if it asks for no more
+    than max_retry_after seconds; anything else is permanent.
+    """
+    retry_statuses = (429, 500, 502, 503, 504)
+    retry_exceptions = (requests.ConnectionError, requests.Timeout,
+        requests.exceptions.ChunkedEncodingError)
+
+    def __init__(self, max_retries=3, backoff=1, max_backoff=60,
+            max_retry_after=300):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+
+    def is_transient(self, response=None, exception=None):
+        if exception is not None:
+            return isinstance(exception, self.retry_exceptions)
+        return response.status_code in self.retry_statuses
+
+    def _retry_after(self, response):
+        try:
+            value = response.headers['Retry-After']
+        except (AttributeError, KeyError):
+            return None
+        try:
+            return max(0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def delay(self, attempt, response=None):
+        """
+        Returns the seconds to wait before retry number attempt (from 0),
+        or None if the request shouldn't be retried.
+        """
+        if attempt >= self.max_retries:
+            return None
+        retry_after = self._retry_after(response)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        # Equal jitter: at least half the exponential backoff
+        backoff = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+class _HostState():
+    def __init__(self):
+        self.failures = {}
+        self.open_until = 0
+        self.trips = 0
+
+class CircuitBreaker():
+    """
+    Pauses requests to a host after threshold consecutive failures of one
+    kind, such as 'transport' errors or pages showing the scraper is
+    'blocked'.  Each pause is twice as long as the last, starting at
+    reset_timeout seconds.  Once a host has tripped max_trips times without
+    a success in between, CircuitOpenError is raised instead of waiting.
+    Responses with blocked_statuses count as the host blocking the scraper.
+    """
+    blocked_statuses = (401, 403)
+
+    def __init__(self, threshold=5, reset_timeout=60, max_trips=4):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.max_trips = max_trips
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host):
+        try:
+            return self._hosts[host]
+        except KeyError:
+            return self._hosts.setdefault(host, _HostState())
+
+    def record_success(self, host, kind='transport'):
+        with self._lock:
+            state = self._state(host)
+            state.failures[kind] = 0
+            if not any(state.failures.values()):
+                state.trips = 0
+
+    def record_failure(self, host, kind='transport'):
+        with self._lock:
+            state = self._state(host)
+            failures = state.failures.get(kind, 0) + 1
+            if failures < self.threshold:
+                state.failures[kind] = failures
+                return
+            # Half-open after the pause: one more failure trips it again
+            state.failures[kind] = self.threshold - 1
+            state.open_until = time.time() + \
+                self.reset_timeout * 2 ** state.trips
+            state.trips += 1
+
+    def wait(self, host):
+        """
+        Blocks while the circuit for host is open, returning the time waited.
+        """
+        with self._lock:
+            state = self._state(host)
+            if state.trips > self.max_trips:
+                raise CircuitOpenError(host)
+            wait = state.open_until - time.time()
+        if wait > 0:
+            print(f'Pausing requests to {host} for {int(wait)}s')
+            time.sleep(wait)
+            return wait
+        return 0
@@ -0,0 +1,195 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Scheduling of re-scrapes of the auctions already stored: which search
+results are due, and when each auction closes
+"""
+
+from datetime import datetime, timedelta
+import heapq
+
+from sqlalchemy import select, func, or_, not_
+
+from auction_scraper.storage import SQLITE_MAX_VARIABLES
+
+# The tiers of search results, in the order they're reported
+NEW = 'new'
+LIVE_SOON = 'live and ending soon'
+LIVE_LATER = 'live and ending later'
+FINISHED = 'finished'
+TIERS = (NEW, LIVE_SOON, LIVE_LATER, FINISHED)
+
+class RefreshPolicy():
+    """
+    How often search results are re-scraped, by tier.  New auctions are
+    always scraped.  Live auctions ending within soon are re-scraped once
+    live_soon has passed since they were last seen, and the rest, including
+    those without an end time, once live_later has.  An auction that has
+    ended is scraped once more after its end, then never again.
+    """
+    def __init__(self, soon=timedelta(hours=24), live_soon=timedelta(hours=1),
+            live_later=timedelta(hours=24)):
+        if soon < timedelta(0) or live_soon < timedelta(0) or \
+                live_later < timedelta(0):
+            raise ValueError('Refresh intervals must not be negative')
+        self.soon = soon
+        self.live_soon = live_soon
+        self.live_later = live_later
+
+    def tier(self, end_time, last_seen, final, now):
+        """
+        Returns the tier of a stored auction, and whether it's due to be
+        scraped.
+        """
+        if final:
+            return FINISHED, False
+        if end_time is not None and end_time <= now:
+            # Scraped before it ended, its final state is still to be seen
+            if last_seen is None or last_seen < end_time:
+                return LIVE_SOON, True
+            return FINISHED, False
+
+        if end_time is not None and end_time - now <= self.soon:
+            tier, interval = LIVE_SOON, self.live_soon
+        else:
+            tier, interval = LIVE_LATER, self.live_later
+        return tier, last_seen is None or now - last_seen >= interval
+
+class RefreshPlan():
+    """
+    The search results of a run sorted into tiers, as {tier: [auction_id]},
+    and the ids of those due to be scraped, in the order they were given.
+    """
+    def __init__(self, tiers, due):
+        self.tiers = tiers
+        self.due = due
+
+    def __str__(self):
+        counts = ', '.join(f'{len(self.tiers[t])} {t}' for t in TIERS)
+        total = sum(len(ids) for ids in self.tiers.values())
+        return f'Scraping {len(self.due)} of {total} results ({counts})'
+
+def plan_refresh(connection, auction_table, auction_ids, policy,
+        final_columns=(), now=None):
+    """
+    Sorts auction_ids into tiers by the rows of auction_table stored for
+    them, read in one query, and decides which are due under policy.  An
+    auction is final, and never scraped again, once it has been scraped
+    after it closed, or any of the boolean final_columns is true.  Rows
+    without last_seen fall back to when they were last modified.
+    Returns a RefreshPlan
+    """
+    if now is None:
+        now = datetime.utcnow()
+    auction_ids = list(dict.fromkeys(auction_ids))
+    columns = [auction_table.id, auction_table.end_time,
+        func.coalesce(auction_table.last_seen, auction_table.date_modified),
+        auction_table.final_fetched_at.isnot(None)] \
+        + [getattr(auction_table, c) for c in final_columns]
+
+    stored = {}
+    for i in range(0, len(auction_ids), SQLITE_MAX_VARIABLES):
+        chunk = auction_ids[i:i + SQLITE_MAX_VARIABLES]
+        for auction_id, end_time, last_seen, *final in connection.execute(
+                select(*columns).where(auction_table.id.in_(chunk))):
+            stored[auction_id] = (end_time, last_seen, any(final))
+
+    tiers = {t: [] for t in TIERS}
+    due = []
+    for auction_id in auction_ids:
+        if auction_id in stored:
+            tier, is_due = policy.tier(*stored[auction_id], now)
+        else:
+            tier, is_due = NEW, True
+        tiers[tier].append(auction_id)
+        if is_due:
+            due.append(auction_id)
+    return RefreshPlan(tiers, due)
+
+def fresh_profiles(connection, profile_table, ttl, now=None):
+    """
+    Returns the set of ids of the profiles of profile_table last seen, or
+    failing that modified, within ttl of now.  Read in one query.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    last_seen = func.coalesce(profile_table.last_seen,
+        profile_table.date_modified)
+    return set(connection.execute(select(profile_table.id) \
+        .where(last_seen >= now - ttl)).scalars())
+
+class CloseSchedule():
+    """
+    A heap of auctions keyed by end time, popped in batches of those that
+    close within window of the first, each due grace after the last of
+    them closes.  Pushing an auction again moves it to its new end time.
+    """
+    def __init__(self, grace=timedelta(minutes=5),
+            window=timedelta(minutes=5)):
+        if grace < timedelta(0) or window < timedelta(0):
+            raise ValueError('grace and window must not be negative')
+        self.grace = grace
+        self.window = window
+        self._heap = []
+        # The current end time of each auction, which stale entries of the
+        # heap no longer match
+        self._end_times = {}
+
+    def __len__(self):
+        return len(self._end_times)
+
+    def push(self, auction_id, end_time):
+        self._end_times[auction_id] = end_time
+        heapq.heappush(self._heap, (end_time, auction_id))
+
+    def pop_batch(self):
+        """
+        Pops the next batch of auctions.
+        Returns a tuple (when the batch is due, [auction_id]), or None if
+        the schedule is empty
+        """
+        batch = []
+        first = None
+        while self._heap and (first is None or \
+                self._heap[0][0] <= first + self.window):
+            end_time, auction_id = heapq.heappop(self._heap)
+            if self._end_times.get(auction_id) != end_time:
+                continue
+            del self._end_times[auction_id]
+            if first is None:
+                first = end_time
+            batch.append(auction_id)
+            last = end_time
+        if not batch:
+            return None
+        return last + self.grace, batch
+
+def closing_auctions(connection, auction_table, until, final_columns=()):
+    """
+    Returns a list of (auction_id, end_time, uri) of the auctions of
+    auction_table closing before until, including those already closed,
+    that haven't yet been seen after closing and aren't marked final by
+    final_columns.  As in plan_refresh, rows without last_seen fall back to
+    when they were last modified.  Read in one query, by end time.
+    """
+    final = [getattr(auction_table, c).is_(True) for c in final_columns]
+    last_seen = func.coalesce(auction_table.last_seen,
+        auction_table.date_modified)
+    query = select(auction_table.id, auction_table.end_time,
+            auction_table.uri) \
+        .where(auction_table.end_time <= until) \
+        .where(auction_table.final_fetched_at.is_(None)) \
+        .where(or_(last_seen.is_(None), last_seen < auction_table.end_time)) \
+        .order_by(auction_table.end_time)
+    if final:
+        query = query.where(not_(or_(*final)))
+    return [tuple(row) for row in connection.execute(query)]
@@ -13,10 +13,12 @@
 The database models for data scraped from catawiki.com
 """
 
-from sqlalchemy import Column, Boolean, DateTime, Float, Integer, String
+from sqlalchemy import Column, BigInteger, Boolean, DateTime, Float, \
+    Integer, String
 from sqlalchemy.types import Text
+from sqlalchemy.schema import ForeignKey
 from auction_scraper.abstract_models import BaseAuction, BaseProfile, \
-    BaseAuctionRelationshipMeta
+    BaseAuctionImage, BaseAuctionSnapshot, BaseAuctionRelationshipMeta
 
 # Define the database models
 class CataWikiProfile(BaseProfile):
@@ -33,15 +35,33 @@ class CataWikiProfile(BaseProfile):
 
 class CataWikiAuction(BaseAuction, metaclass=BaseAuctionRelationshipMeta, \
         profile_table='CataWikiProfile', \
-        profile_table_name='catawiki_profiles'):
+        profile_table_name='catawiki_profiles', \
+        image_table='CataWikiAuctionImage', \
+        snapshot_table='CataWikiAuctionSnapshot'):
     """
     The database model for an auction on catawiki.com
     """
     __tablename__ = 'catawiki_auctions'
     subtitle = Column(Text())
     lot_details = Column(Text())
-    expert_estimate_max = Column(Integer)
-    expert_estimate_min = Column(Integer)
+    expert_estimate_max = Column(BigInteger, info={'minor_units': True})
+    expert_estimate_min = Column(BigInteger, info={'minor_units': True})
     reserve_price_met = Column(Boolean)
-    closed = Column(Boolean)
+    closed = Column(Boolean, index=True)
     sold = Column(Boolean)
+
+class CataWikiAuctionImage(BaseAuctionImage):
+    """
+    The database model for an image of an auction on catawiki.com
+    """
+    __tablename__ = 'catawiki_auction_images'
+    auction_id = Column(Text(), ForeignKey('catawiki_auctions.id'), \
+        primary_key=True, index=True)
+
+class CataWikiAuctionSnapshot(BaseAuctionSnapshot):
+    """
+    The database model for a snapshot of an auction on catawiki.com
+    """
+    __tablename__ = 'catawiki_auction_snapshots'
+    auction_id = Column(Text(), ForeignKey('catawiki_auctions.id'), \
+        nullable=False)
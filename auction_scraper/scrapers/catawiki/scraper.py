@@ -13,13 +13,20 @@ A scraper for catawiki.com
 """
 
 from datetime import datetime
+import asyncio
 import json
-from urllib.parse import urljoin
+import re
+from urllib.parse import urljoin, urlparse
+
+from bs4 import SoupStrainer
 
 from auction_scraper.abstract_scraper import AbstractAuctionScraper, \
-    SearchResult
+    SearchResult, page_digest
+from auction_scraper.strainer import class_pattern, start_tag
+from auction_scraper.prices import minor_units
 from auction_scraper.scrapers.catawiki.models import \
-    CataWikiAuction, CataWikiProfile
+    CataWikiAuction, CataWikiProfile, CataWikiAuctionImage, \
+    CataWikiAuctionSnapshot
 
 def fill_in_field(table, table_field_name,
                   data, data_field_names,
@@ -56,11 +63,24 @@ class CataWikiAuctionScraper(AbstractAuctionScraper):
     """
     auction_table = CataWikiAuction
     profile_table = CataWikiProfile
+    auction_image_table = CataWikiAuctionImage
+    auction_snapshot_table = CataWikiAuctionSnapshot
+    auction_final_columns = ('closed', 'sold')
     base_uri = 'https://www.catawiki.com'
     auction_suffix = '/l/{}'
     profile_suffix = '/u/{}'
     search_suffix = '/buyer/api/v1/search?q={}&page={}'
     backend_name = 'catawiki'
+    default_parser = 'lxml'
+    rate_limits = {
+        'www.catawiki.com': (2, 4),
+        '.catawiki.nl': (10, 20),
+    }
+
+    auction_parse_only = SoupStrainer('div',
+        class_=class_pattern('lot-details-page-wrapper'))
+    profile_parse_only = SoupStrainer('div',
+        attrs={'data-react-component': 'LotsFromSellerSidebar'})
 
     currency = 'EUR'
 
@@ -72,7 +92,10 @@ class CataWikiAuctionScraper(AbstractAuctionScraper):
     base_bidding_api_uri = urljoin(base_uri, bidding_api_uri_suffix)
     base_bids_api_uri = urljoin(base_uri, bids_api_uri_suffix)
 
-    def __parse_2020_auction_soup(self, soup):
+    def __minor_units(self, price):
+        return minor_units(price, self.currency)
+
+    def __parse_2020_auction_soup(self, soup, extras):
         json_div_attrs = {"class": "lot-details-page-wrapper"}
         data_json = soup.find("div", attrs=json_div_attrs)['data-props']
         data = json.loads(data_json)
@@ -88,8 +111,8 @@ class CataWikiAuctionScraper(AbstractAuctionScraper):
             details = dict((spec['name'], spec['value']) for spec in specs)
             return json_dumps_unicode(details)
 
-        def combine_image_urls(imgs):
-            return ' '.join((img['large'] for img in imgs))
+        def get_images(imgs):
+            return self._images(img['large'] for img in imgs)
 
         fill_in_field(auction, 'title',
                       data, ('lotTitle',),
@@ -109,29 +132,26 @@ class CataWikiAuctionScraper(AbstractAuctionScraper):
                       data, ('specifications',),
                       default="{}",
                       process=extract_lot_details)
-        fill_in_field(auction, 'image_urls',
+        fill_in_field(auction, 'images',
                       data, ('images',),
-                      default="",
-                      process=combine_image_urls)
+                      default=[],
+                      process=get_images)
         fill_in_field(auction, 'expert_estimate_max',
                       data, ('expertsEstimate', 'max', self.currency),
-                      default=-1)
+                      default=None, process=self.__minor_units)
         fill_in_field(auction, 'expert_estimate_min',
                       data, ('expertsEstimate', 'min', self.currency),
-                      default=-1)
+                      default=None, process=self.__minor_units)
 
-        try:
-            bidding = self._get_json(self.base_bidding_api_uri.format(auction_id))
-        except ValueError:
-            # The catawiki API is now shut
-            pass
-        else:
+        # The catawiki API is now shut, so these may not have been fetched
+        bidding = extras.get('bidding')
+        if bidding is not None:
             fill_in_field(auction, 'starting_price',
                           bidding, ('bidding', 'start_bid_amount'),
-                          default=-1)
+                          default=None, process=self.__minor_units)
             fill_in_field(auction, 'latest_price',
                           bidding, ('bidding', 'current_bid_amount'),
-                          default=-1)
+                          default=None, process=self.__minor_units)
             fill_in_field(auction, 'reserve_price_met',
                           bidding, ('bidding', 'reserve_price_met'),
                           default=False)
@@ -143,39 +163,92 @@ class CataWikiAuctionScraper(AbstractAuctionScraper):
                           default=None,
                           process=lambda t: datetime.fromisoformat(t.rstrip('Z')))
             fill_in_field(auction, 'end_time',
-                          bidding, ('bidding', 'bidding_start_time'),
+                          bidding, ('bidding', 'bidding_end_time'),
                           default=None,
                           process=lambda t: datetime.fromisoformat(t.rstrip('Z')))
             fill_in_field(auction, 'sold',
                           bidding, ('bidding', 'sold'),
                           default=False)
 
-        try:
-            bids = self._get_json(self.base_bids_api_uri.format(auction_id))
-        except ValueError:
-            # The catawiki API is now shut
-            pass
-        else:
+        bids = extras.get('bids')
+        if bids is not None:
             fill_in_field(auction, 'n_bids',
                           bids, ('meta', 'total'),
                           default=-1)
 
         return auction
 
-    def __parse_auction_page(self, soup):
+    def __parse_auction_page(self, soup, extras):
         # Try various parsing methods until one works
         try:
-            return self.__parse_2020_auction_soup(soup)
+            return self.__parse_2020_auction_soup(soup, extras)
         except Exception as e:
             raise ValueError(f'Could not parse web page: {e}')
 
-    def _scrape_auction_page(self, uri):
-        soup = self._get_page(uri)
-        auction = self.__parse_auction_page(soup)
+    def __lot_id(self, raw):
+        match = re.search(r'/l/(\d+)', urlparse(raw.uri).path)
+        if match is not None:
+            return match.group(1)
+        soup = self._make_soup(raw.text, self.auction_parse_only)
+        div = soup.find('div', attrs={'class': 'lot-details-page-wrapper'})
+        return json.loads(div['data-props'])['lotId']
+
+    def _fetch_auction_page(self, uri):
+        raw = self._get_raw_page(uri)
+
+        # The bidding APIs are fetched here, leaving parsing free of requests
+        try:
+            auction_id = self.__lot_id(raw)
+        except Exception:
+            # Left for the parse stage to report
+            return raw
+        try:
+            raw.extras['bidding'] = self._get_json( \
+                self.base_bidding_api_uri.format(auction_id))
+        except ValueError:
+            pass
+        try:
+            raw.extras['bids'] = self._get_json( \
+                self.base_bids_api_uri.format(auction_id))
+        except ValueError:
+            pass
+        return raw
+
+    async def _fetch_auction_page_async(self, uri):
+        raw = await self._get_raw_page_async(uri)
+        try:
+            auction_id = self.__lot_id(raw)
+        except Exception:
+            return raw
+
+        # Both bidding APIs are requested at once
+        for name, result in zip(('bidding', 'bids'), await asyncio.gather(
+                self._get_json_async(self.base_bidding_api_uri \
+                    .format(auction_id)),
+                self._get_json_async(self.base_bids_api_uri \
+                    .format(auction_id)),
+                return_exceptions=True)):
+            if isinstance(result, ValueError):
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            raw.extras[name] = result
+        return raw
+
+    def _auction_digest(self, raw):
+        # The lot's data-props and bidding APIs are all that's parsed
+        tag = start_tag(raw.text, 'div', 'lot-details-page-wrapper')
+        if tag is None:
+            return super()._auction_digest(raw)
+        return page_digest(tag, raw.extras)
+
+    def _parse_auction_page(self, raw):
+        soup = self._make_soup(raw.text, self.auction_parse_only)
+        auction = self.__parse_auction_page(soup, raw.extras)
 
         # Add the uri to the auction
-        auction.uri = uri
-        return auction, soup.prettify()
+        auction.uri = raw.uri
+        return auction
 
     def __parse_2020_profile_soup(self, soup):
         # Extract profile attributes
@@ -221,23 +294,40 @@ class CataWikiAuctionScraper(AbstractAuctionScraper):
         except Exception as e:
             raise ValueError(f'Could not parse web page: {e}')
 
-    def _scrape_profile_page(self, uri):
-        soup = self._get_page(uri)
+    def _profile_digest(self, raw):
+        tag = start_tag(raw.text, 'div',
+            'data-react-component="LotsFromSellerSidebar"')
+        if tag is None:
+            return super()._profile_digest(raw)
+        return page_digest(tag)
+
+    def _parse_profile_page(self, raw):
+        soup = self._make_soup(raw.text, self.profile_parse_only)
         profile = self.__parse_profile_page(soup)
 
         # Add the uri to the profile
-        profile.uri = uri
-        return profile, soup.prettify()
+        profile.uri = raw.uri
+        return profile
 
-    def _scrape_search_page(self, uri):
-        data = self._get_json(uri)
+    def _parse_search_page(self, raw):
+        data = json.loads(raw.text)
 
         output = {}
         for result in data['lots']:
             output[str(result['id'])] = \
                     SearchResult(result['title'], result['url'])
 
-        return output, json_dumps_unicode(data)
+        return output, self.__search_total(data)
+
+    def __search_total(self, data):
+        try:
+            return int(data['meta']['total'])
+        except (KeyError, TypeError, ValueError):
+            pass
+        try:
+            return int(data['total'])
+        except (KeyError, TypeError, ValueError):
+            return None
 
     def _generate_search_uri(self, query_string, n_page):
         if not isinstance(n_page, int) or n_page < 1:
@@ -11,9 +11,10 @@
 
 from auction_scraper.abstract_scraper import AbstractAuctionScraper
 from auction_scraper.abstract_models import BaseAuction, BaseProfile, \
-    BaseAuctionRelationshipMeta
-from sqlalchemy import Table, Column, Integer, String, DateTime, Boolean
+    BaseAuctionImage, BaseAuctionSnapshot, BaseAuctionRelationshipMeta
+from sqlalchemy import Table, Column, BigInteger, Integer, DateTime, Boolean
 from sqlalchemy.types import Text
+from sqlalchemy.schema import ForeignKey
 from urllib.parse import urlparse, urljoin
 
 # Define the database models
@@ -26,12 +27,24 @@ class EbayProfile(BaseProfile):
     percent_positive_feedback = Column(Integer)
 
 class EbayAuction(BaseAuction, metaclass=BaseAuctionRelationshipMeta, \
-        profile_table='EbayProfile', profile_table_name='ebay_profiles'):
+        profile_table='EbayProfile', profile_table_name='ebay_profiles', \
+        image_table='EbayAuctionImage', \
+        snapshot_table='EbayAuctionSnapshot'):
     __tablename__ = 'ebay_auctions'
-    buy_now_price = Column(String(16))
+    buy_now_price = Column(BigInteger, info={'minor_units': True})
     location = Column(Text())
     locale = Column(Text())
     quantity = Column(Integer())
     video_url = Column(Text())
     vat_included = Column(Boolean)
-    domain = Column(Text())
+    domain = Column(Text(), index=True)
+
+class EbayAuctionImage(BaseAuctionImage):
+    __tablename__ = 'ebay_auction_images'
+    auction_id = Column(Text(), ForeignKey('ebay_auctions.id'), \
+        primary_key=True, index=True)
+
+class EbayAuctionSnapshot(BaseAuctionSnapshot):
+    __tablename__ = 'ebay_auction_snapshots'
+    auction_id = Column(Text(), ForeignKey('ebay_auctions.id'), \
+        nullable=False)
@@ -0,0 +1,266 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Extraction of the key/value assignments embedded in eBay's $rwidgets
+scripts, using a single-pass JavaScript tokenizer
+"""
+
+import re
+
+_TOKEN = re.compile(r'''
+    (?P<space>[\s\ufeff]+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>(?:[^\W\d]|\$)(?:\w|\$)*)
+  | (?P<punct>>>>=|===|!==|>>>|<<=|>>=|=>|==|!=|<=|>=|&&|\|\||\+\+|--
+        |[-+*/%&|^]=|<<|>>|[{}()\[\];,.<>+\-*/%&|^!~?:=])
+''', re.S | re.X)
+
+_REGEX = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+
+_ASSIGNMENT_OPS = frozenset(('=', '+=', '-=', '*=', '/=', '%=', '<<=', '>>=',
+    '>>>=', '&=', '^=', '|='))
+# A '/' after any of these starts a regex rather than a division
+_REGEX_PRECEDING_NAMES = frozenset(('return', 'typeof', 'instanceof', 'in',
+    'new', 'delete', 'void', 'throw', 'case', 'do', 'else'))
+# Names that aren't a complete value on their own
+_NON_VALUE_NAMES = frozenset(('function', 'new', 'typeof', 'void', 'delete',
+    'this', 'in', 'instanceof', 'var', 'let', 'const', 'return'))
+# Tokens ending a single-token value
+_VALUE_TERMINATORS = frozenset((',', '}', ')', ']', ';', ':'))
+# Punctuation starting a new statement after a line break, rather than
+# continuing the expression before it
+_STATEMENT_STARTS = frozenset(('++', '--', '!', '~', '{'))
+
+class _Token():
+    __slots__ = ('kind', 'text', 'newline')
+
+    def __init__(self, kind, text, newline):
+        self.kind = kind
+        self.text = text
+        self.newline = newline
+
+def _regex_allowed(previous):
+    if previous is None:
+        return True
+    if previous.kind == 'punct':
+        return previous.text not in (')', ']', '}')
+    if previous.kind == 'name':
+        return previous.text in _REGEX_PRECEDING_NAMES
+    return False
+
+def tokenize(text):
+    """
+    Splits JavaScript source into a list of tokens, dropping whitespace and
+    comments.  Each token records whether a line break preceded it.
+    """
+    tokens = []
+    previous = None
+    newline = False
+    pos, end = 0, len(text)
+    match = _TOKEN.match
+    while pos < end:
+        if text[pos] == '/' and _regex_allowed(previous):
+            m = _REGEX.match(text, pos)
+            if m is not None:
+                previous = _Token('regex', m.group(), newline)
+                tokens.append(previous)
+                newline = False
+                pos = m.end()
+                continue
+
+        m = match(text, pos)
+        if m is None:
+            # A character outside the grammar; keep it as punctuation
+            previous = _Token('punct', text[pos], newline)
+            tokens.append(previous)
+            newline = False
+            pos += 1
+            continue
+
+        kind = m.lastgroup
+        pos = m.end()
+        if kind in ('space', 'comment'):
+            if '\n' in m.group():
+                newline = True
+            continue
+        previous = _Token(kind, m.group(), newline)
+        tokens.append(previous)
+        newline = False
+    return tokens
+
+def _is_object_literal(previous):
+    """
+    Whether a '{' following the token previous opens an object literal,
+    rather than a block.
+    """
+    if previous is None:
+        return False
+    if previous.kind == 'punct':
+        return previous.text not in (')', '{', '}', ';', '=>')
+    if previous.kind == 'name':
+        return previous.text in ('return', 'typeof', 'in', 'case', 'new',
+            'void', 'throw', 'delete')
+    return False
+
+def _value(tokens, i, end):
+    """
+    Returns the value of the expression starting at tokens[i], as the
+    scraper reads it: the source of a lone literal or identifier, with double
+    quotes stripped, or '' for anything compound.
+    """
+    if i >= end:
+        return ''
+    token = tokens[i]
+    if token.kind == 'name' and token.text in _NON_VALUE_NAMES:
+        return ''
+    if token.kind not in ('string', 'number', 'regex', 'name'):
+        return ''
+
+    if i + 1 < end:
+        following = tokens[i + 1]
+        if following.kind == 'punct':
+            # A line break only ends the value before a token that can't
+            # continue the expression
+            ends = following.text in _VALUE_TERMINATORS or \
+                (following.newline and following.text in _STATEMENT_STARTS)
+        else:
+            ends = following.newline
+        if not ends:
+            return ''
+
+    if token.kind == 'string':
+        return token.text.strip('"')
+    return token.text
+
+def _assignments(tokens, start, end):
+    """
+    Yields (key, value) for each object property and assignment expression
+    in tokens[start:end], in source order.
+    """
+    # Each entry is [opening bracket, is an object literal, in a var list]
+    stack = [['(', False, False]]
+    for i in range(start, end):
+        token = tokens[i]
+        previous = tokens[i - 1] if i > 0 else None
+        if token.kind == 'name':
+            if token.text in ('var', 'let', 'const'):
+                stack[-1][2] = True
+            continue
+        if token.kind != 'punct':
+            continue
+
+        text = token.text
+        if text in ('(', '['):
+            stack.append([text, False, False])
+        elif text == '{':
+            stack.append([text, _is_object_literal(previous), False])
+        elif text in (')', ']', '}'):
+            if len(stack) > 1:
+                stack.pop()
+        elif text == ';':
+            stack[-1][2] = False
+        elif text == ':':
+            before = tokens[i - 2] if i - 2 >= start - 1 else None
+            if stack[-1][1] and previous.kind in ('string', 'name', 'number') \
+                    and before is not None and before.kind == 'punct' \
+                    and before.text in ('{', ','):
+                key = previous.text.strip('"') \
+                    if previous.kind == 'string' else previous.text
+                yield key, _value(tokens, i + 1, end)
+        elif text in _ASSIGNMENT_OPS:
+            before = tokens[i - 2] if i >= 2 else None
+            if previous.kind == 'name' and not (before is not None and \
+                    before.kind == 'punct' and before.text == '.'):
+                # Declarations in a var list aren't assignments
+                if stack[-1][2] and before is not None and \
+                        (before.text in ('var', 'let', 'const') or \
+                            (before.kind == 'punct' and before.text == ',')):
+                    continue
+                key = previous.text
+            else:
+                key = ''
+            yield key, _value(tokens, i + 1, end)
+
+def _rwidgets_calls(tokens):
+    """
+    Yields the (start, end) token range of the arguments of each direct
+    call to $rwidgets, in source order.
+    """
+    for i, token in enumerate(tokens):
+        if token.kind != 'name' or token.text != '$rwidgets':
+            continue
+        if i > 0 and tokens[i - 1].kind == 'punct' and \
+                tokens[i - 1].text == '.':
+            continue
+        if i + 1 >= len(tokens) or tokens[i + 1].text != '(':
+            continue
+
+        depth = 0
+        for j in range(i + 1, len(tokens)):
+            if tokens[j].kind != 'punct':
+                continue
+            if tokens[j].text in ('(', '[', '{'):
+                depth += 1
+            elif tokens[j].text in (')', ']', '}'):
+                depth -= 1
+                if depth == 0:
+                    break
+        yield i + 2, j
+
+def extract_rwidgets(script_texts, duplicates=()):
+    """
+    Returns the dict of raw values assigned within the $rwidgets calls of
+    script_texts.  Keys in duplicates map to a list of every value they
+    were given, across all calls; other keys take their last value that
+    isn't 'null'.
+    """
+    raw_values = {}
+    for script_text in script_texts:
+        tokens = tokenize(script_text)
+        for start, end in _rwidgets_calls(tokens):
+            fields = {}
+            for k, v in _assignments(tokens, start, end):
+                if k in duplicates:
+                    try:
+                        fields[k].append(v)
+                    except KeyError:
+                        fields[k] = [v]
+                else:
+                    fields[k] = v
+
+            # Merge fields and raw_values, resolving duplicates
+            for (k, v) in fields.items():
+                if k in duplicates:
+                    try:
+                        raw_values[k] += v
+                    except KeyError:
+                        raw_values[k] = v
+                elif v != 'null':
+                    raw_values[k] = v
+    return raw_values
+
+def rwidgets_scripts(soup):
+    """
+    Returns the text of each inline script under div#JSDF of an eBay
+    auction soup that calls $rwidgets.
+    """
+    div = soup.find('div', id='JSDF')
+    scripts = div.find_all('script', src=None)
+
+    script_texts = []
+    for script in scripts:
+        for s in script.contents:
+            if '$rwidgets' in s:
+                script_texts.append(s)
+    return script_texts
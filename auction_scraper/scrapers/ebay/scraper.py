@@ -10,37 +10,30 @@
 #   GNU General Public License for more details.
 
 from urllib.parse import urlparse, urljoin
-from os import devnull
-import sys
-from slimit.parser import Parser
-from slimit.visitors import nodevisitor
-from slimit import ast
 from datetime import datetime
 from sqlalchemy_utils import Currency
 import json
 import unicodedata
 import dateutil.parser
 import re
-import contextlib
-
-@contextlib.contextmanager
-def silence_output():
-    save_stdout = sys.stdout
-    save_stderr = sys.stderr
-    sys.stdout = open(devnull, 'w')
-    sys.stderr = open(devnull, 'w')
-    yield
-    sys.stdout = save_stdout
-    sys.stderr = save_stderr
 
+from bs4 import SoupStrainer
 from auction_scraper.abstract_scraper import AbstractAuctionScraper, \
     SearchResult
+from auction_scraper.strainer import AnyOfStrainer, class_pattern, \
+    iframe_srcs
+from auction_scraper.prices import minor_units
+from auction_scraper.scrapers.ebay.rwidgets import extract_rwidgets, \
+    rwidgets_scripts
 from auction_scraper.scrapers.ebay.models import \
-    EbayAuction, EbayProfile
+    EbayAuction, EbayProfile, EbayAuctionImage, \
+    EbayAuctionSnapshot
 
 class EbayAuctionScraper(AbstractAuctionScraper):
     auction_table = EbayAuction
     profile_table = EbayProfile
+    auction_image_table = EbayAuctionImage
+    auction_snapshot_table = EbayAuctionSnapshot
     base_uri = 'https://www.ebay.com'
     auction_suffix = '/itm/{}'
     profile_suffix = '/usr/{}'
@@ -48,6 +41,26 @@ class EbayAuctionScraper(AbstractAuctionScraper):
         # search list is significantly harder to scraper, not containing
         # 'ListViewInner', or even auction IDs within the div
     backend_name = 'ebay'
+    default_parser = 'lxml'
+    rate_limits = {
+        'www.ebay.com': (2, 4),
+        '.ebayimg.com': (10, 20),
+    }
+    # The item description is the only iframe needed from an auction page
+    iframe_allow = [r'^https?://[^/]*ebaydesc\.com/']
+
+    auction_parse_only = AnyOfStrainer(
+        SoupStrainer('div', id='JSDF'),
+        SoupStrainer('h1', id='itemTitle'),
+        SoupStrainer('div', id='desc_div'),
+        SoupStrainer('div', class_=class_pattern('vi_descsnpt_holder')))
+    profile_parse_only = AnyOfStrainer(
+        SoupStrainer('h2', class_=class_pattern('bio')),
+        SoupStrainer('div', id='member_info'),
+        SoupStrainer('div', class_=class_pattern('perctg')))
+    search_parse_only = AnyOfStrainer(
+        SoupStrainer('ul', id='ListViewInner'),
+        SoupStrainer('ul', class_=class_pattern('srp-results')))
 
     # the raw values that appear multiple times in the API
     auction_duplicates = ['maxImageUrl', 'displayImgUrl']
@@ -85,58 +98,7 @@ class EbayAuctionScraper(AbstractAuctionScraper):
 
     def __parse_2020_auction_soup(self, soup, duplicates):
         def get_embedded_json():
-            # Strip c from s, without exception
-            def strip(s, c):
-                if isinstance(s, str):
-                    return s.strip(c)
-                return s
-
-            div = soup.find('div', id='JSDF')
-            scripts = div.find_all('script', src=None)
-
-            # Look for $rwidgets
-            script_texts = []
-            for script in scripts:
-                for s in script.contents:
-                    if '$rwidgets' in s:
-                        script_texts.append(s)
-
-            # Bodge until we get rid of slimit
-            with silence_output():
-                parser = Parser()
-
-            raw_values = {}
-            for script_text in script_texts:
-                tree = parser.parse(script_text)
-                # Parsing js
-                for node in nodevisitor.visit(tree):
-                    if isinstance(node, ast.FunctionCall):
-                        if isinstance(node.identifier, ast.Identifier):
-                            if node.identifier.value == '$rwidgets':
-                                # Deal with here
-                                fields = {}
-                                for n in nodevisitor.visit(node):
-                                    if isinstance(n, ast.Assign):
-                                        k = getattr(n.left, 'value', '').strip('"')
-                                        v = strip(getattr(n.right, 'value', ''), '"')
-                                        if k in duplicates:
-                                            try:
-                                                fields[k].append(v)
-                                            except KeyError:
-                                                fields[k] = [v]
-                                        else:
-                                            fields[k] = v
-
-                                # Merge fields and raw_values, resolving duplicates
-                                for (k, v) in fields.items():
-                                    if k in duplicates:
-                                        try:
-                                            raw_values[k] += v
-                                        except KeyError:
-                                            raw_values[k] = v
-                                    elif v != 'null':
-                                        raw_values[k] = v
-            return raw_values
+            return extract_rwidgets(rwidgets_scripts(soup), duplicates)
 
         def get_image_urls(raw_values):
             # TODO: sometimes only displayImgUrl is given, when the s-l600 image exists
@@ -264,7 +226,8 @@ class EbayAuctionScraper(AbstractAuctionScraper):
                     type(raw_values['ccode'])))
 
         try:
-            auction.latest_price = str(float(raw_values['bidPriceDouble']))
+            auction.latest_price = minor_units( \
+                float(raw_values['bidPriceDouble']), auction.currency)
         except (KeyError, TypeError):
             pass
         except ValueError:
@@ -273,7 +236,8 @@ class EbayAuctionScraper(AbstractAuctionScraper):
                     type(raw_values['bidPriceDouble'])))
 
         try:
-            auction.buy_now_price = str(float(raw_values['binPriceDouble']))
+            auction.buy_now_price = minor_units( \
+                float(raw_values['binPriceDouble']), auction.currency)
         except (KeyError, TypeError):
             pass
         except ValueError:
@@ -282,7 +246,7 @@ class EbayAuctionScraper(AbstractAuctionScraper):
                     type(raw_values['binPriceDouble'])))
 
         # TODO: add starting price, winner, location
-        auction.image_urls = ' '.join(image_urls)
+        auction.images = self._images(image_urls)
 
         try:
             auction.locale = str(raw_values['locale'])
@@ -341,13 +305,24 @@ class EbayAuctionScraper(AbstractAuctionScraper):
         except Exception:
             raise ValueError('Could not parse web page')
 
-    def _scrape_auction_page(self, uri):
-        soup = self._get_page(uri)
+    def _fetch_auction_page(self, uri):
+        raw = self._get_raw_page(uri)
+
+        # The description lives in an iframe, fetched here with the page.
+        # Its src is found without parsing the page, which is left to the
+        # parse stage
+        raw.extras['iframes'] = self._fetch_iframes(iframe_srcs(raw.text),
+            uri)
+        return raw
+
+    def _parse_auction_page(self, raw):
+        soup = self._make_soup(raw.text, self.auction_parse_only)
+        self._insert_iframes(soup, raw.uri, raw.extras.get('iframes', {}))
         auction = self.__parse_auction_page(soup)
 
         # Add the uri to the auction
-        auction.uri = uri
-        return auction, soup.prettify()
+        auction.uri = raw.uri
+        return auction
 
     def __parse_2020_profile_soup(self, soup, profile_id):
         # Extract profile attributes
@@ -413,14 +388,14 @@ class EbayAuctionScraper(AbstractAuctionScraper):
         except Exception:
             raise ValueError('Could not parse web page')
 
-    def _scrape_profile_page(self, uri):
-        profile_id = urlparse(uri).path.split('/')[2]
-        soup = self._get_page(uri)
+    def _parse_profile_page(self, raw):
+        profile_id = urlparse(raw.uri).path.split('/')[2]
+        soup = self._make_soup(raw.text, self.profile_parse_only)
         profile = self.__parse_profile_page(soup, profile_id)
 
         # Add the uri to the profile
-        profile.uri = uri
-        return profile, soup.prettify()
+        profile.uri = raw.uri
+        return profile
 
     def __parse_2020_search_soup(self, soup):
         auctions_list = soup.find('ul', id='ListViewInner')
@@ -463,9 +438,9 @@ class EbayAuctionScraper(AbstractAuctionScraper):
         except Exception:
             raise ValueError('Could not parse web page')
 
-    def _scrape_search_page(self, uri):
-        soup = self._get_page(uri)
-        return self.__parse_search_page(soup), soup.prettify()
+    def _parse_search_page(self, raw):
+        soup = self._make_soup(raw.text, self.search_parse_only)
+        return self.__parse_search_page(soup), None
 
     def _generate_search_uri(self, query_string, n_page):
         if not isinstance(n_page, int) or n_page < 1:
@@ -11,9 +11,10 @@
 
 from auction_scraper.abstract_scraper import AbstractAuctionScraper
 from auction_scraper.abstract_models import BaseAuction, BaseProfile, \
-    BaseAuctionRelationshipMeta
-from sqlalchemy import Table, Column, Integer, String
+    BaseAuctionImage, BaseAuctionSnapshot, BaseAuctionRelationshipMeta
+from sqlalchemy import Table, Column, BigInteger, Integer
 from sqlalchemy.types import Text
+from sqlalchemy.schema import ForeignKey
 from urllib.parse import urlparse, urljoin
 
 # Define the database models
@@ -26,10 +27,22 @@ class LiveAuctioneersProfile(BaseProfile):
 
 class LiveAuctioneersAuction(BaseAuction, metaclass=BaseAuctionRelationshipMeta, \
         profile_table='LiveAuctioneersProfile', \
-        profile_table_name='liveauctioneers_profiles'):
+        profile_table_name='liveauctioneers_profiles', \
+        image_table='LiveAuctioneersAuctionImage', \
+        snapshot_table='LiveAuctioneersAuctionSnapshot'):
     __tablename__ = 'liveauctioneers_auctions'
     location = Column(Text())
     lot_number = Column(Integer)
     condition = Column(Text())
-    high_bid_estimate = Column(String(16))
-    low_bid_estimate = Column(String(16))
+    high_bid_estimate = Column(BigInteger, info={'minor_units': True})
+    low_bid_estimate = Column(BigInteger, info={'minor_units': True})
+
+class LiveAuctioneersAuctionImage(BaseAuctionImage):
+    __tablename__ = 'liveauctioneers_auction_images'
+    auction_id = Column(Text(), ForeignKey('liveauctioneers_auctions.id'), \
+        primary_key=True, index=True)
+
+class LiveAuctioneersAuctionSnapshot(BaseAuctionSnapshot):
+    __tablename__ = 'liveauctioneers_auction_snapshots'
+    auction_id = Column(Text(), ForeignKey('liveauctioneers_auctions.id'), \
+        nullable=False)
@@ -10,36 +10,26 @@
 #   GNU General Public License for more details.
 
 from urllib.parse import urlparse, urljoin
-from os import devnull
-import sys
-from slimit.parser import Parser
-from slimit.visitors import nodevisitor
-from slimit import ast
 import re
 from datetime import datetime
 from pathlib import Path
 from sqlalchemy_utils import Currency
-import contextlib
-import json
-
-@contextlib.contextmanager
-def silence_output():
-    save_stdout = sys.stdout
-    save_stderr = sys.stderr
-    sys.stdout = open(devnull, 'w')
-    sys.stderr = open(devnull, 'w')
-    yield
-    sys.stdout = save_stdout
-    sys.stderr = save_stderr
 
+from bs4 import SoupStrainer
 from auction_scraper.abstract_scraper import AbstractAuctionScraper, \
-    SearchResult, UnexpectedPageError
+    SearchResult, UnexpectedPageError, page_digest
+from auction_scraper.prices import minor_units
+from auction_scraper.scrapers.liveauctioneers.window_data import \
+    extract_window_data, window_data_text
 from auction_scraper.scrapers.liveauctioneers.models import \
-    LiveAuctioneersAuction, LiveAuctioneersProfile
+    LiveAuctioneersAuction, LiveAuctioneersProfile, \
+    LiveAuctioneersAuctionImage, LiveAuctioneersAuctionSnapshot
 
 class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
     auction_table = LiveAuctioneersAuction
     profile_table = LiveAuctioneersProfile
+    auction_image_table = LiveAuctioneersAuctionImage
+    auction_snapshot_table = LiveAuctioneersAuctionSnapshot
     base_uri = 'https://www.liveauctioneers.com'
     auction_suffix = '/item/{}'
     profile_suffix = '/auctioneer/{}'
@@ -47,25 +37,29 @@ class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
     search_suffix_archive = '/search/?keyword={}&page={}&status=archive'
     search_suffix = None
     backend_name = 'liveauctioneers'
+    default_parser = 'lxml'
+    rate_limits = {
+        'www.liveauctioneers.com': (1, 2),
+        '.liveauctioneers.com': (10, 20),
+    }
+
+    # The page data is read straight from the page text; auctions also need
+    # the thumbnails
+    auction_parse_only = SoupStrainer('img',
+        class_=re.compile('Thumbnail__StyledThumbnailImage'))
 
     def __init__(self, archive_search, **kwargs):
         self.search_suffix = self.search_suffix_archive if archive_search else self.search_suffix_default
         super().__init__(**kwargs)
 
-    def __extract_data_json(self, soup):
-
-        js = soup.body.find('script', attrs={'data-reactroot': True})
-        if js is None:
-            raise UnexpectedPageError(soup)
-        js = js.string
-
-        # bash embedded JavaScript into being valid JSON
-        assert(js[:14]=='window.__data=' and js[-1:]==';')
-        js = js[14:-1]
-        js = js.replace('undefined', 'null')
+    __thumbnail_pattern = re.compile(
+        r'<img[^>]*Thumbnail__StyledThumbnailImage[^>]*>')
 
-        result = json.loads(js)
-        return result
+    def __extract_data_json(self, text):
+        data = extract_window_data(text)
+        if data is None:
+            raise UnexpectedPageError(text)
+        return data
 
     def __address_from_seller(self, seller):
         address_strings = [seller.get('address'), seller.get('address2'), seller.get('city'), seller.get('country')]
@@ -73,7 +67,7 @@ class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
 
     ### auction scraping
 
-    def __parse_2021_auction_soup(self, soup, auction_id):
+    def __parse_2021_auction_soup(self, text, soup, auction_id):
 
         def get_embedded_image_urls():
             imgs = soup.find_all('img', attrs= \
@@ -85,20 +79,20 @@ class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
                 urls.append('.'.join(urllist))
             return urls
 
-        json = self.__extract_data_json(soup)
+        data = self.__extract_data_json(text)
 
-        item = json['item']['byId'][str(auction_id)]
-        item_detail = json['itemDetail']['byId'][str(auction_id)]
-        bidding_info = json['biddingInfo']['byId'][str(auction_id)]
-        catalog = json['catalog']['byId'][str(item['catalogId'])]
+        item = data['item']['byId'][str(auction_id)]
+        item_detail = data['itemDetail']['byId'][str(auction_id)]
+        bidding_info = data['biddingInfo']['byId'][str(auction_id)]
+        catalog = data['catalog']['byId'][str(item['catalogId'])]
 
         # Extract additional auctioneer info
         seller_id = item['sellerId']
-        seller = json['seller']['byId'][str(seller_id)]
+        seller = data['seller']['byId'][str(seller_id)]
         auctioneer = seller['name']
         location = self.__address_from_seller(seller)
 
-        image_urls = ' '.join(get_embedded_image_urls())
+        image_urls = get_embedded_image_urls()
 
         # Construct the auction object
         auction = LiveAuctioneersAuction(id=str(auction_id))
@@ -155,7 +149,8 @@ class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
 
         auction.currency = Currency('USD')
         try:
-            auction.latest_price = float(bidding_info['salePrice'])
+            auction.latest_price = minor_units( \
+                float(bidding_info['salePrice']), auction.currency)
         except KeyError:
             pass
         except ValueError:
@@ -164,7 +159,8 @@ class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
                     type(bidding_info['salePrice'])))
 
         try:
-            auction.starting_price = float(item['startPrice'])
+            auction.starting_price = minor_units( \
+                float(item['startPrice']), auction.currency)
         except KeyError:
             pass
         except ValueError:
@@ -183,7 +179,7 @@ class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
                 .format(auction_id, item['lotNumber'], \
                     type(item['lotNumber'])))
 
-        auction.image_urls = image_urls
+        auction.images = self._images(image_urls)
         try:
             auction.condition = item_detail['conditionReport']
         except KeyError:
@@ -194,7 +190,8 @@ class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
                     type(item_detail['conditionReport'])))
 
         try:
-            auction.high_bid_estimate = float(item['highBidEstimate'])
+            auction.high_bid_estimate = minor_units( \
+                float(item['highBidEstimate']), auction.currency)
         except KeyError:
             pass
         except ValueError:
@@ -203,7 +200,8 @@ class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
                     type(item['highBidEstimate'])))
 
         try:
-            auction.low_bid_estimate = float(item['lowBidEstimate'])
+            auction.low_bid_estimate = minor_units( \
+                float(item['lowBidEstimate']), auction.currency)
         except KeyError:
             pass
         except ValueError:
@@ -218,32 +216,44 @@ class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
 
         return auction
 
-    def __parse_auction_page(self, soup, auction_id):
+    def __parse_auction_page(self, text, soup, auction_id):
         # Try various parsing methods until one works
         try:
-            return self.__parse_2021_auction_soup(soup, auction_id)
+            return self.__parse_2021_auction_soup(text, soup, auction_id)
+        except UnexpectedPageError as e:
+            raise e
         except Exception:
             raise ValueError('Could not parse web page')
 
-    def _scrape_auction_page(self, uri):
-        auction_id = urlparse(uri).path.split('/')[2].split('_')[0]
-        soup = self._get_page(uri)
-        auction = self.__parse_auction_page(soup, auction_id)
+    def _auction_digest(self, raw):
+        # Only the window data, as text, and the thumbnails are parsed, not
+        # the rest of the page.  The data is left to be decoded by the parse
+        data = window_data_text(raw.text)
+        if data is None:
+            return super()._auction_digest(raw)
+        return page_digest(data, re.findall(self.__thumbnail_pattern,
+            raw.text))
+
+    def _parse_auction_page(self, raw):
+        auction_id = urlparse(raw.uri).path.split('/')[2].split('_')[0]
+        text = raw.text
+        soup = self._make_soup(text, self.auction_parse_only)
+        auction = self.__parse_auction_page(text, soup, auction_id)
 
         # Add the uri to the auction
-        auction.uri = uri
-        return auction, soup.prettify()
+        auction.uri = raw.uri
+        return auction
 
     ### profile scraping
 
-    def __parse_2021_profile_soup(self, soup, profile_id):
+    def __parse_2021_profile_soup(self, text, profile_id):
 
-        json = self.__extract_data_json(soup)
+        data = self.__extract_data_json(text)
 
-        seller = json['seller']['byId'][str(profile_id)]
-        seller_detail = json['sellerDetail']['byId'][str(profile_id)]
-        seller_ratings = json['sellerRatings']['byId'][str(profile_id)]
-        n_followers = json['sellerFollowerCount']['byId'][str(profile_id)]
+        seller = data['seller']['byId'][str(profile_id)]
+        seller_detail = data['sellerDetail']['byId'][str(profile_id)]
+        seller_ratings = data['sellerRatings']['byId'][str(profile_id)]
+        n_followers = data['sellerFollowerCount']['byId'][str(profile_id)]
 
         # Construct the profile object
         profile = LiveAuctioneersProfile(id=str(profile_id))
@@ -256,36 +266,42 @@ class LiveAuctioneersAuctionScraper(AbstractAuctionScraper):
 
         return profile
 
-    def __parse_profile_page(self, soup, profile_id):
+    def __parse_profile_page(self, text, profile_id):
         # Try various parsing methods until one works
         try:
-            return self.__parse_2021_profile_soup(soup, profile_id)
+            return self.__parse_2021_profile_soup(text, profile_id)
+        except UnexpectedPageError as e:
+            raise e
         except Exception:
             raise ValueError('Could not parse web page')
 
-    def _scrape_profile_page(self, uri):
-        profile_id = urlparse(uri).path.split('/')[2]
-        soup = self._get_page(uri)
-        profile = self.__parse_profile_page(soup, profile_id)
+    def _profile_digest(self, raw):
+        data = window_data_text(raw.text)
+        if data is None:
+            return super()._profile_digest(raw)
+        return page_digest(data)
+
+    def _parse_profile_page(self, raw):
+        profile_id = urlparse(raw.uri).path.split('/')[2]
+        profile = self.__parse_profile_page(raw.text, profile_id)
 
         # Add the uri to the profile
-        profile.uri = uri
-        return profile, soup.prettify()
+        profile.uri = raw.uri
+        return profile
 
     ### search scraping
 
-    def _scrape_search_page(self, uri):
-        soup = self._get_page(uri)
-        json = self.__extract_data_json(soup)
+    def _parse_search_page(self, raw):
+        data = self.__extract_data_json(raw.text)
 
         output = {}
-        for auction_id in (json['search']['itemIds'] or []):
-            item = json['item']['byId'][str(auction_id)]
+        for auction_id in (data['search']['itemIds'] or []):
+            item = data['item']['byId'][str(auction_id)]
             output[auction_id] = SearchResult( \
                 name=item['title'], uri=self.base_auction_uri.format(auction_id))
             # print(f'Found auction page "{item["title"]}"')
 
-        return output, soup.prettify()
+        return output, None
 
     def _generate_search_uri(self, query_string, n_page):
         if not isinstance(n_page, int) or n_page < 1:
@@ -0,0 +1,146 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Decoding of the window.__data payload embedded in liveauctioneers pages,
+straight from the page text
+"""
+
+from json import JSONDecoder, JSONDecodeError
+from json.decoder import WHITESPACE, scanstring
+from json.scanner import c_make_scanner, py_make_scanner
+
+WINDOW_DATA_MARKER = 'window.__data='
+# A script can't contain its own end tag, so the payload ends before it
+_SCRIPT_END = '</script>'
+_WHITESPACE = ' \t\n\r'
+
+def _skip(s, end):
+    # Most separators aren't followed by whitespace, so avoid the regex
+    if s[end:end + 1] in _WHITESPACE:
+        return WHITESPACE.match(s, end).end()
+    return end
+
+class JSLiteralDecoder(JSONDecoder):
+    """
+    A JSON decoder that also accepts a bare undefined, as JavaScript
+    object literals may contain, decoding it to None.
+    Values are decoded by the C scanner where possible; only the objects
+    and arrays containing an undefined are walked in Python.
+    """
+    def __init__(self):
+        super().__init__()
+        self._py_scan = py_make_scanner(self)
+        # Without the C scanner, everything is decoded in Python
+        self._c_scan = c_make_scanner(self) if c_make_scanner else \
+            self._py_scan
+        self.scan_once = self._scan_value
+
+    def _scan_value(self, s, idx):
+        try:
+            return self._c_scan(s, idx)
+        except (StopIteration, JSONDecodeError):
+            return self._scan_literal(s, idx)
+
+    def _scan_literal(self, s, idx):
+        """
+        Decodes the value at idx that the C scanner couldn't.
+        """
+        if s.startswith('undefined', idx):
+            return None, idx + 9
+        nextchar = s[idx:idx + 1]
+        if nextchar == '{':
+            return self._scan_object(s, idx + 1)
+        if nextchar == '[':
+            return self._scan_array(s, idx + 1)
+        try:
+            return self._py_scan(s, idx)
+        except StopIteration:
+            raise JSONDecodeError('Expecting value', s, idx) from None
+
+    def _scan_object(self, s, end):
+        c_scan, scan_literal = self._c_scan, self._scan_literal
+        pairs = {}
+        end = _skip(s, end)
+        if s[end:end + 1] == '}':
+            return pairs, end + 1
+        while True:
+            if s[end:end + 1] != '"':
+                raise JSONDecodeError('Expecting property name enclosed in '
+                    'double quotes', s, end)
+            key, end = scanstring(s, end + 1)
+            if s[end:end + 1] != ':':
+                end = _skip(s, end)
+                if s[end:end + 1] != ':':
+                    raise JSONDecodeError("Expecting ':' delimiter", s, end)
+            end = _skip(s, end + 1)
+            try:
+                value, end = c_scan(s, end)
+            except (StopIteration, JSONDecodeError):
+                value, end = scan_literal(s, end)
+            pairs[key] = value
+
+            nextchar = s[end:end + 1]
+            if nextchar in _WHITESPACE:
+                end = _skip(s, end)
+                nextchar = s[end:end + 1]
+            if nextchar == '}':
+                return pairs, end + 1
+            if nextchar != ',':
+                raise JSONDecodeError("Expecting ',' delimiter", s, end)
+            end = _skip(s, end + 1)
+
+    def _scan_array(self, s, end):
+        c_scan, scan_literal = self._c_scan, self._scan_literal
+        values = []
+        end = _skip(s, end)
+        if s[end:end + 1] == ']':
+            return values, end + 1
+        while True:
+            try:
+                value, end = c_scan(s, end)
+            except (StopIteration, JSONDecodeError):
+                value, end = scan_literal(s, end)
+            values.append(value)
+
+            nextchar = s[end:end + 1]
+            if nextchar in _WHITESPACE:
+                end = _skip(s, end)
+                nextchar = s[end:end + 1]
+            if nextchar == ']':
+                return values, end + 1
+            if nextchar != ',':
+                raise JSONDecodeError("Expecting ',' delimiter", s, end)
+            end = _skip(s, end + 1)
+
+def extract_window_data(text):
+    """
+    Returns the decoded value assigned to window.__data in the page text,
+    or None if the page doesn't assign it.
+    """
+    idx = text.find(WINDOW_DATA_MARKER)
+    if idx == -1:
+        return None
+    idx = _skip(text, idx + len(WINDOW_DATA_MARKER))
+    data, _ = JSLiteralDecoder().raw_decode(text, idx)
+    return data
+
+def window_data_text(text):
+    """
+    Returns the text of the value assigned to window.__data in the page
+    text, without decoding it, or None if the page doesn't assign it.
+    """
+    idx = text.find(WINDOW_DATA_MARKER)
+    if idx == -1:
+        return None
+    idx += len(WINDOW_DATA_MARKER)
+    end = text.find(_SCRIPT_END, idx)
+    return text[idx:end if end != -1 else len(text)].strip().rstrip(';')
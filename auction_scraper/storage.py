@@ -0,0 +1,120 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Tuning of the SQLite database, applied to each connection as it's opened
+"""
+
+import os.path
+import sqlite3
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+# Presets of the pragmas below.  Both use WAL, so the database can be read
+# while a scrape writes to it
+SQLITE_PROFILES = {
+    # Safe against power loss once a transaction commits, sharing the
+    # database with other readers and scraper processes
+    'concurrent-readers': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 20,
+    },
+    # Fastest for a large one-off scrape.  Commits aren't synced, so a
+    # power loss may lose the most recent ones, though never corrupts the
+    # database
+    'bulk-load': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'mmap_size': 1024 * 1024 * 1024,
+        'cache_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 60,
+    },
+}
+
+# The most bound parameters SQLite allows in one statement, for chunking
+# queries on long lists of ids
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32) \
+    else 999
+
+_JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+_SYNCHRONOUS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+_TEMP_STORES = ('DEFAULT', 'FILE', 'MEMORY')
+
+def sqlite_pragmas(profile='concurrent-readers', **overrides):
+    """
+    Returns the pragmas of profile, with any of overrides that aren't None
+    replacing them.  mmap_size and cache_size are in bytes, and
+    busy_timeout in seconds.
+    """
+    try:
+        pragmas = dict(SQLITE_PROFILES[profile])
+    except KeyError:
+        raise ValueError(f'Unknown SQLite profile {profile}, expected one '
+            f'of {", ".join(SQLITE_PROFILES)}') from None
+
+    for k, v in overrides.items():
+        if k not in pragmas:
+            raise ValueError(f'Unknown SQLite pragma {k}')
+        if v is not None:
+            pragmas[k] = v
+
+    for k, allowed in (('journal_mode', _JOURNAL_MODES),
+            ('synchronous', _SYNCHRONOUS), ('temp_store', _TEMP_STORES)):
+        pragmas[k] = str(pragmas[k]).upper()
+        if pragmas[k] not in allowed:
+            raise ValueError(f'{k} must be one of {", ".join(allowed)}')
+    return pragmas
+
+def _pragma_statements(pragmas):
+    yield f'PRAGMA busy_timeout = {int(pragmas["busy_timeout"] * 1000)}'
+    # The journal mode is set first, as it may need the database unlocked
+    yield f'PRAGMA journal_mode = {pragmas["journal_mode"]}'
+    yield f'PRAGMA synchronous = {pragmas["synchronous"]}'
+    yield f'PRAGMA mmap_size = {int(pragmas["mmap_size"])}'
+    # A negative cache_size is in KiB rather than pages
+    yield f'PRAGMA cache_size = {-int(pragmas["cache_size"] // 1024)}'
+    yield f'PRAGMA temp_store = {pragmas["temp_store"]}'
+
+def configure_sqlite(engine, pragmas):
+    """
+    Applies pragmas, as returned by sqlite_pragmas, to every connection
+    engine opens.  Engines for other databases are left alone.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    statements = list(_pragma_statements(pragmas))
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+def create_sqlite_engine(path, pragmas, echo=False):
+    """
+    Returns an engine for the SQLite database at path, applying pragmas to
+    each connection it opens.  Connections are pooled and shared between
+    threads, rather than opened per session, so each is configured once and
+    keeps its page cache and memory map between sessions.
+    """
+    engine = create_engine('sqlite:///' + os.path.abspath(path), echo=echo,
+        poolclass=QueuePool, connect_args={'check_same_thread': False})
+    configure_sqlite(engine, pragmas)
+    return engine
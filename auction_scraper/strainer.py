@@ -0,0 +1,83 @@
+#   Copyright (c) 2020 Dreaming Spires
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+
+"""
+Strainers declaring the parts of a page a backend's extractors need
+"""
+
+import html
+import re
+from bs4 import SoupStrainer
+
+def class_pattern(name):
+    """
+    Returns a pattern matching a class attribute that includes name, for
+    use in a SoupStrainer.  Strainers see the raw attribute value, so a
+    plain string wouldn't match elements with several classes.
+    """
+    return re.compile(r'(^|\s){}(\s|$)'.format(re.escape(name)))
+
+# The rest of a start tag, whose quoted attribute values may contain '>'
+_START_TAG_REST = re.compile(r'''(?:[^>"']|"[^"]*"|'[^']*')*>''')
+
+def start_tag(text, name, marker):
+    """
+    Returns the source of the first name start tag in text whose
+    attributes contain marker, or None if there isn't one.  Found without
+    parsing the page, for digesting the data attributes extractors read.
+    """
+    pos = text.find(marker)
+    while pos != -1:
+        start = text.rfind('<' + name, 0, pos)
+        if start != -1:
+            match = _START_TAG_REST.match(text, start + len(name) + 1)
+            if match is not None and match.end() > pos:
+                return text[start:match.end()]
+        pos = text.find(marker, pos + 1)
+    return None
+
+# The src of an iframe start tag, skipping quoted values of the attributes
+# before it
+_IFRAME_SRC = re.compile(r'''<iframe\b(?:[^>"']|"[^"]*"|'[^']*')*?'''
+    r'''\ssrc\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''', re.IGNORECASE)
+
+def iframe_srcs(text):
+    """
+    Returns the src of each iframe in text, in order, found without
+    parsing the page.
+    """
+    return [html.unescape(''.join(m)) for m in _IFRAME_SRC.findall(text)]
+
+class AnyOfStrainer(SoupStrainer):
+    """
+    A SoupStrainer keeping every top-level element, with its subtree,
+    that matches any of strainers.  Nothing else is built into the soup.
+    """
+    excludes_everything = False
+
+    def __init__(self, *strainers):
+        super().__init__()
+        self.strainers = strainers
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return any(s.allow_tag_creation(nsprefix, name, attrs) \
+            for s in self.strainers)
+
+    def allow_string_creation(self, string):
+        return False
+
+    # bs4 before 4.13 asks search_tag instead of allow_tag_creation
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        for s in self.strainers:
+            found = s.search_tag(markup_name, markup_attrs)
+            if found:
+                return found
+        return None
@@ -15,6 +15,8 @@ import sys
 import traceback
 import pathlib
 import typing
+import asyncio
+from datetime import timedelta
 from enum import Enum
 
 from auction_scraper.scrapers.catawiki.scraper import \
@@ -23,6 +25,9 @@ from auction_scraper.scrapers.liveauctioneers.scraper import \
     LiveAuctioneersAuctionScraper
 from auction_scraper.scrapers.ebay.scraper import \
     EbayAuctionScraper
+from auction_scraper.parity import parser_parity
+from auction_scraper.scheduler import RefreshPolicy
+from auction_scraper.storage import SQLITE_PROFILES
 
 class Backend(Enum):
     catawiki = 'catawiki'
@@ -36,9 +41,12 @@ backend_dict = {
         Backend.liveauctioneers: LiveAuctioneersAuctionScraper,
     }
 
+SQLiteProfile = Enum('SQLiteProfile', {k: k for k in SQLITE_PROFILES})
+
 app = typer.Typer()
 init_state = {'db_path': None, 'base_uri': None, 'data_location': None,
-        'verbose': None, 'archive_search': False}
+        'verbose': None, 'archive_search': False, 'pool_maxsize': 10,
+        'rate_limit_path': None, 'image_workers': 4, 'cache_path': None}
 state = {}
 
 def setup():
@@ -52,6 +60,10 @@ def setup():
         raise ValueError('No valid scraper backend provided')
     return scraper
 
+def teardown(scraper):
+    scraper.report_cache_stats()
+    scraper.close()
+
 @app.callback()
 def main(db_path: str = typer.Argument(..., help='The path of the sqlite database file to be written to'),
         backend: Backend = typer.Argument(..., help='The auction scraping backend'),
@@ -59,11 +71,45 @@ def main(db_path: str = typer.Argument(..., help='The path of the sqlite databas
         save_images: bool = typer.Option(False, help='Save images to data-location.  Requires --data-location'),
         save_pages: bool = typer.Option(False, help='Save pages to data-location. Requires --data-location'),
         verbose: bool = False,
-        base_uri: str = typer.Option(None, help='Override the base url used to resolve the auction site')):
+        base_uri: str = typer.Option(None, help='Override the base url used to resolve the auction site'),
+        pool_size: int = typer.Option(10, help='The number of keep-alive connections to hold open per host'),
+        rate_limit_path: str = typer.Option(None, help='A sqlite file through which concurrent scraper processes share their rate limits'),
+        image_workers: int = typer.Option(4, help='The number of images to download in parallel'),
+        cache_path: str = typer.Option(None, help='A sqlite file in which to cache and revalidate fetched pages'),
+        cache_size: int = typer.Option(256, help='The maximum size of the page cache, in MiB'),
+        max_retries: int = typer.Option(3, help='The number of times to retry a request that failed transiently'),
+        parser: str = typer.Option(None, help='The HTML parser to use (html.parser, lxml or html5lib).  Defaults to the fastest one supported by the backend'),
+        write_batch_size: int = typer.Option(100, help='The number of scraped auctions and profiles to write to the database in each transaction'),
+        write_delay: float = typer.Option(5, help='The longest time, in seconds, that a scraped auction or profile waits to be written'),
+        write_queue_size: int = typer.Option(1000, help='The number of scraped auctions and profiles that may wait to be written before scraping pauses'),
+        sqlite_profile: SQLiteProfile = typer.Option('concurrent-readers', help='The preset of SQLite tuning to apply, overridden by the options below'),
+        journal_mode: str = typer.Option(None, help='The SQLite journal mode.  WAL lets the database be read while it is written'),
+        synchronous: str = typer.Option(None, help='How often SQLite syncs to disk (OFF, NORMAL, FULL or EXTRA)'),
+        mmap_size: int = typer.Option(None, help='The size of the database to memory map, in MiB'),
+        sqlite_cache_size: int = typer.Option(None, help='The size of the SQLite page cache, in MiB'),
+        temp_store: str = typer.Option(None, help='Where SQLite keeps temporary tables (DEFAULT, FILE or MEMORY)'),
+        busy_timeout: float = typer.Option(None, help='How long to wait for another process writing to the database, in seconds')):
     init_state['db_path'] = db_path
     init_state['data_location'] = data_location
     init_state['verbose'] = verbose
     init_state['base_uri'] = base_uri
+    init_state['pool_maxsize'] = pool_size
+    init_state['rate_limit_path'] = rate_limit_path
+    init_state['image_workers'] = image_workers
+    init_state['cache_path'] = cache_path
+    init_state['cache_size'] = cache_size * 1024 * 1024
+    init_state['max_retries'] = max_retries
+    init_state['parser'] = parser
+    init_state['write_batch_size'] = write_batch_size
+    init_state['write_delay'] = write_delay
+    init_state['write_queue_size'] = write_queue_size
+    init_state['sqlite_profile'] = sqlite_profile.value
+    init_state['sqlite_options'] = {'journal_mode': journal_mode,
+        'synchronous': synchronous, 'temp_store': temp_store,
+        'busy_timeout': busy_timeout,
+        'mmap_size': None if mmap_size is None else mmap_size * 1024 * 1024,
+        'cache_size': None if sqlite_cache_size is None \
+            else sqlite_cache_size * 1024 * 1024}
     state['save_images'] = save_images
     state['save_pages'] = save_pages
     state['backend'] = backend
@@ -86,6 +132,7 @@ def auction(auction: typing.List[str] = typer.Argument(..., help= \
                 print(colored(traceback.format_exc(), 'red'))
             else:
                 print(colored(e, 'red'))
+    teardown(scraper)
     if exception:
         sys.exit(1)
 
@@ -106,6 +153,7 @@ def profile(profile: typing.List[str] = typer.Argument(..., help= \
                 print(colored(traceback.format_exc(), 'red'))
             else:
                 print(colored(e, 'red'))
+    teardown(scraper)
     if exception:
         sys.exit(1)
 
@@ -115,7 +163,25 @@ def search(n_results: int = typer.Argument(..., help='The number of results to r
     archive_search: bool = typer.Option(False, help= \
         'Search archived auctions instead of live auctions. Only available for the liveauctioneers backend.'),
     cooldown: int = typer.Option(0, help= \
-        'Time to wait between making requests, in seconds')
+        'Time to wait between making requests, in seconds'),
+    concurrency: int = typer.Option(1, help= \
+        'The number of auction and profile scrapes to keep in flight per host'),
+    parse_workers: int = typer.Option(None, help= \
+        'The number of processes parsing pages when concurrency is above 1.  Defaults to the number of CPUs'),
+    queue_depth: int = typer.Option(32, help= \
+        'The number of pages to buffer between the fetch, parse and write stages when concurrency is above 1'),
+    skip_unchanged: bool = typer.Option(True, '--skip-unchanged/--reparse-unchanged', help= \
+        'Skip parsing and writing auctions and profiles whose pages are unchanged since they were last scraped'),
+    tiered_refresh: bool = typer.Option(False, help= \
+        'Only scrape the results due by their tier: new, live and ending soon, live and ending later, or finished.  Finished auctions are never scraped again'),
+    soon_hours: float = typer.Option(24, help= \
+        'With --tiered-refresh, the hours before its end within which a live auction is ending soon'),
+    live_soon_hours: float = typer.Option(1, help= \
+        'With --tiered-refresh, the hours between scrapes of live auctions ending soon'),
+    live_later_hours: float = typer.Option(24, help= \
+        'With --tiered-refresh, the hours between scrapes of live auctions ending later'),
+    profile_ttl: float = typer.Option(None, help= \
+        'Skip seller profiles refreshed within this many hours.  By default, every seller is scraped')
       ):
     """
     Performs a search, returning the top n_results results for each query_string.
@@ -123,20 +189,89 @@ def search(n_results: int = typer.Argument(..., help='The number of results to r
     """
     init_state['archive_search'] = archive_search
     init_state['cooldown'] = cooldown
+    refresh = RefreshPolicy(soon=timedelta(hours=soon_hours),
+        live_soon=timedelta(hours=live_soon_hours),
+        live_later=timedelta(hours=live_later_hours)) if tiered_refresh else None
+    profile_ttl = timedelta(hours=profile_ttl) \
+        if profile_ttl is not None else None
     scraper = setup()
     exception = False
     try:
-        scraper.scrape_search_to_db(query_string, n_results,
-            state['save_pages'], state['save_images'])
+        if concurrency > 1:
+            asyncio.run(scraper.scrape_search_to_db_async(query_string,
+                n_results, state['save_pages'], state['save_images'],
+                concurrency, parse_workers=parse_workers,
+                parse_queue_depth=queue_depth, write_queue_depth=queue_depth,
+                skip_unchanged=skip_unchanged, refresh=refresh,
+                profile_ttl=profile_ttl))
+        else:
+            scraper.scrape_search_to_db(query_string, n_results,
+                state['save_pages'], state['save_images'],
+                skip_unchanged=skip_unchanged, refresh=refresh,
+                profile_ttl=profile_ttl)
     except Exception as e:
         exception = True
         if init_state['verbose']:
             print(colored(traceback.format_exc(), 'red'))
         else:
             print(colored(e, 'red'))
+    teardown(scraper)
     if exception:
         sys.exit(1)
 
+@app.command()
+def follow_closes(horizon_hours: float = typer.Option(6, help= \
+        'Follow the stored auctions closing within this many hours, as well as those already closed'),
+    grace_minutes: float = typer.Option(5, help= \
+        'The minutes after an auction closes to wait before scraping it'),
+    window_minutes: float = typer.Option(5, help= \
+        'The minutes within which auctions closing are scraped together')
+      ):
+    """
+    Scrapes each stored auction once, soon after it closes, to capture its final price.
+    """
+    scraper = setup()
+    exception = False
+    try:
+        scraper.follow_closes(timedelta(hours=horizon_hours),
+            timedelta(minutes=grace_minutes),
+            timedelta(minutes=window_minutes), state['save_pages'],
+            state['save_images'])
+    except Exception as e:
+        exception = True
+        if init_state['verbose']:
+            print(colored(traceback.format_exc(), 'red'))
+        else:
+            print(colored(e, 'red'))
+    teardown(scraper)
+    if exception:
+        sys.exit(1)
+
+class PageKind(Enum):
+    auction = 'auction'
+    profile = 'profile'
+
+@app.command()
+def parity(kind: PageKind = typer.Argument(..., help='The kind of the saved pages'),
+    pages: typing.List[str] = typer.Argument(..., help= \
+        'A list of pages saved with --save-pages'),
+    parsers: typing.List[str] = typer.Option(['html.parser', 'lxml'],
+        '--parser', help='The parsers to compare')):
+    """
+    Checks that saved pages scrape to the same fields under each parser.
+    """
+    scraper = setup()
+    differences = parser_parity(scraper, kind.value, pages, parsers)
+    for page, field, values in differences:
+        if field is None:
+            print(colored(f'{page}: could not scrape: {values}', 'red'))
+        else:
+            print(colored(f'{page}: {field} differs: {values}', 'red'))
+    print(f'{len(pages)} pages checked, {len(differences)} differences')
+    teardown(scraper)
+    if differences:
+        sys.exit(1)
+
 def main():
     app()
 
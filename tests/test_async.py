@@ -0,0 +1,110 @@
+import asyncio
+import html
+import json
+from pathlib import Path
+from urllib.parse import urlparse
+
+from auction_scraper.http_cache import build_response
+from auction_scraper.scrapers.catawiki.scraper import CataWikiAuctionScraper
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'catawiki'
+
+
+def lot_page(lot_id):
+    props = {'lotId': lot_id, 'lotTitle': f'Lot {lot_id}',
+        'sellerInfo': {'id': lot_id % 2 + 1}}
+    return '<div class="lot-details-page-wrapper" data-props="{}"></div>' \
+        .format(html.escape(json.dumps(props))).encode()
+
+
+def profile_page(profile_id):
+    props = {'seller': {'id': profile_id, 'sellerName': f'S{profile_id}'}}
+    return '<div data-react-component="LotsFromSellerSidebar" ' \
+        'data-props="{}"></div>'.format(html.escape(json.dumps(props))) \
+        .encode()
+
+
+class StubCataWikiScraper(CataWikiAuctionScraper):
+    """
+    Answers a search for four lots from two sellers, without the network
+    """
+    def _fetch(self, uri, **_):
+        if '/search' in uri:
+            lots = [{'id': i, 'title': f'Lot {i}',
+                'url': self.base_auction_uri.format(i)} for i in range(4)] \
+                if uri.endswith('page=1') else []
+            return build_response(uri, 200, {},
+                json.dumps({'lots': lots, 'meta': {'total': 4}}).encode())
+        if '/bidding' in uri:
+            return build_response(uri, 200, {},
+                json.dumps({'lot': {'id': 1}}).encode())
+        if '/l/' in uri:
+            return build_response(uri, 200, {},
+                lot_page(int(uri.rsplit('/', 1)[1])))
+        if '/u/' in uri:
+            return build_response(uri, 200, {},
+                profile_page(int(uri.rsplit('/', 1)[1])))
+        return build_response(uri, 404, {}, b'')
+
+
+class FixtureCataWikiScraper(CataWikiAuctionScraper):
+    """
+    Answers a search for the saved lot, serving the saved pages and the
+    lot's bidding APIs, without the network
+    """
+    def _fetch(self, uri, **_):
+        path = urlparse(uri).path
+        if '/search' in uri:
+            lots = [{'id': 40123, 'title': 'Art Deco silver cigarette case',
+                'url': self.base_auction_uri.format(40123)}] \
+                if uri.endswith('page=1') else []
+            content = {'lots': lots, 'meta': {'total': 1}}
+        elif path.endswith('/bidding'):
+            content = {'bidding': {'current_bid_amount': 120}}
+        elif path.endswith('/bids'):
+            content = {'meta': {'total': 3}}
+        else:
+            kind = 'auction' if path.startswith('/l/') else 'profile'
+            page = FIXTURES / f'{kind}-{path.rsplit("/", 1)[1]}.html'
+            return build_response(uri, 200, {}, page.read_bytes())
+        return build_response(uri, 200, {}, json.dumps(content).encode())
+
+
+def test_async_runs_repeat_on_one_scraper(tmp_path):
+    scraper = StubCataWikiScraper(db_path=tmp_path / 'db.sqlite')
+    try:
+        for _ in range(2):
+            auctions, profiles = asyncio.run(scraper.scrape_search_to_db_async(
+                ['q'], parse_workers=0, skip_unchanged=False))
+            assert sorted(a.id for a in auctions) == ['0', '1', '2', '3']
+            assert sorted(p.id for p in profiles) == ['1', '2']
+            assert scraper._async_executor is None
+    finally:
+        scraper.close()
+
+
+def test_async_fetch_matches_sync(tmp_path):
+    scraper = StubCataWikiScraper(db_path=tmp_path / 'db.sqlite')
+    uri = scraper.base_auction_uri.format(3)
+    try:
+        raw = asyncio.run(scraper._fetch_auction_page_async(uri))
+        # The bids API is missing, so left out
+        assert raw.extras == scraper._fetch_auction_page(uri).extras == \
+            {'bidding': {'lot': {'id': 1}}}
+    finally:
+        scraper.close()
+
+
+def test_pages_parsed_in_worker_process(tmp_path):
+    # The scraper and each page, with the bidding APIs in its extras, are
+    # pickled into the spawned worker
+    scraper = FixtureCataWikiScraper(db_path=tmp_path / 'db.sqlite')
+    try:
+        auctions, profiles = asyncio.run(scraper.scrape_search_to_db_async(
+            ['q'], parse_workers=1))
+        auction, = auctions
+        assert (auction.id, auction.expert_estimate_max, auction.latest_price,
+            auction.n_bids) == ('40123', 45000, 12000, 3)
+        assert [p.name for p in profiles] == ['Zilver & Co']
+    finally:
+        scraper.close()
@@ -0,0 +1,24 @@
+from auction_scraper.abstract_scraper import page_digest
+from auction_scraper.strainer import start_tag, iframe_srcs
+
+
+def test_page_digest_separates_parts():
+    assert page_digest('ab', 'c') != page_digest('a', 'bc')
+    assert page_digest({'a': 1, 'b': 2}) == page_digest({'b': 2, 'a': 1})
+    assert page_digest('a') == page_digest(b'a')
+
+
+def test_start_tag_ignores_rest_of_page():
+    page = '<div id="x">{}<div class="lot" data-props="{{&quot;a&quot;: ' \
+        '\'1>2\'}}">body</div>'
+    tag = start_tag(page.format(''), 'div', 'class="lot"')
+    assert tag == '<div class="lot" data-props="{&quot;a&quot;: \'1>2\'}">'
+    assert start_tag(page.format('<p>ad</p>'), 'div', 'class="lot"') == tag
+    assert start_tag(page, 'div', 'missing') is None
+
+
+def test_iframe_srcs_found_without_parsing():
+    page = '<iframe title="a > b" data-src="x" src="/d?a=1&amp;b=2">' \
+        '</iframe>' \
+        "<IFRAME id=f src='https://e/'></IFRAME><iframe></iframe>"
+    assert iframe_srcs(page) == ['/d?a=1&b=2', 'https://e/']
@@ -0,0 +1,97 @@
+import pytest
+
+from auction_scraper import http_cache
+from auction_scraper.http_cache import HTTPCache, build_response
+
+
+class Clock():
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+class Site():
+    """
+    A fake send, answering each url with its canned response, or 304 when
+    the request's If-None-Match matches the response's ETag.
+    """
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def __call__(self, url, headers=None):
+        self.requests.append((url, headers))
+        status_code, response_headers, content = self.responses[url]
+        etag = response_headers.get('ETag')
+        if etag is not None and (headers or {}).get('If-None-Match') == etag:
+            return build_response(url, 304, response_headers, b'')
+        return build_response(url, status_code, response_headers, content)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http_cache, 'time', clock)
+    return clock
+
+
+def test_fresh_responses_served_from_cache(tmp_path, clock):
+    cache = HTTPCache(tmp_path / 'cache.sqlite')
+    site = Site({'http://a': (200, {'Cache-Control': 'max-age=60'}, b'page')})
+    assert cache.fetch(site, 'http://a').content == b'page'
+    clock.now += 30
+    assert cache.fetch(site, 'http://a').content == b'page'
+    assert len(site.requests) == 1
+
+    # Stale, and without a validator, so fetched again in full
+    clock.now += 60
+    cache.fetch(site, 'http://a')
+    assert site.requests[-1] == ('http://a', {})
+    assert cache.stats() == {'hits': 1, 'revalidations': 0, 'misses': 2,
+        'size': 4}
+
+
+def test_stale_responses_revalidated(tmp_path, clock):
+    cache = HTTPCache(tmp_path / 'cache.sqlite')
+    site = Site({'http://a': (200, {'Cache-Control': 'no-cache',
+        'ETag': '"v1"', 'Last-Modified': 'Tue, 01 Jun 2021 12:00:00 GMT'},
+        b'page')})
+    cache.fetch(site, 'http://a')
+    r = cache.fetch(site, 'http://a')
+    assert r.status_code == 200 and r.content == b'page'
+    assert site.requests[-1] == ('http://a', {'If-None-Match': '"v1"',
+        'If-Modified-Since': 'Tue, 01 Jun 2021 12:00:00 GMT'})
+    assert cache.stats()['revalidations'] == 1
+
+    # Changed since, so replaced
+    site.responses['http://a'] = (200, {'ETag': '"v2"'}, b'new page')
+    assert cache.fetch(site, 'http://a').content == b'new page'
+    assert cache.get('http://a').etag == '"v2"'
+
+
+def test_no_store_and_errors_not_cached(tmp_path, clock):
+    cache = HTTPCache(tmp_path / 'cache.sqlite')
+    site = Site({
+        'http://a': (200, {'Cache-Control': 'no-store, max-age=60'}, b'page'),
+        'http://b': (404, {'Cache-Control': 'max-age=60'}, b'missing'),
+    })
+    for url in ('http://a', 'http://a', 'http://b', 'http://b'):
+        cache.fetch(site, url)
+    assert len(site.requests) == 4
+    assert cache.get('http://a') is None and cache.get('http://b') is None
+
+
+def test_least_recently_used_evicted(tmp_path, clock):
+    cache = HTTPCache(tmp_path / 'cache.sqlite', max_size=10)
+    site = Site({url: (200, {'Cache-Control': 'max-age=600'}, b'1234') \
+        for url in ('http://a', 'http://b', 'http://c')})
+    for url in ('http://a', 'http://b', 'http://a', 'http://c'):
+        clock.now += 1
+        cache.fetch(site, url)
+
+    assert cache.get('http://b') is None
+    assert cache.get('http://a') is not None
+    assert cache.get('http://c') is not None
+    assert cache.stats()['size'] == 8
@@ -0,0 +1,76 @@
+from sqlalchemy import create_engine, inspect
+
+from auction_scraper.abstract_models import Base
+from auction_scraper.migrations import upgrade_schema, get_schema_version, \
+    SCHEMA_VERSION
+from auction_scraper.scrapers.catawiki.models import CataWikiAuction
+
+
+def test_upgrades_database_from_before_migrations(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for index in CataWikiAuction.__table__.indexes:
+            index.drop(connection)
+
+    assert upgrade_schema(engine) == list(range(1, SCHEMA_VERSION + 1))
+    indexes = {i['name'] for i in \
+        inspect(engine).get_indexes('catawiki_auctions')}
+    assert 'ix_catawiki_auctions_seller_id' in indexes
+    with engine.connect() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+
+
+def test_new_database_starts_at_latest_version(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    assert upgrade_schema(engine) == []
+    with engine.connect() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+
+
+def test_moves_image_columns_into_images_table(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql('ALTER TABLE catawiki_auctions '
+            'ADD COLUMN image_urls TEXT')
+        connection.exec_driver_sql('ALTER TABLE catawiki_auctions '
+            "ADD COLUMN image_paths TEXT NOT NULL DEFAULT ''")
+        connection.exec_driver_sql('INSERT INTO catawiki_auctions '
+            '(id, date_created, date_modified, image_urls, image_paths) '
+            "VALUES ('1', '2020-01-01 00:00:00', '2020-01-01 00:00:00', "
+            "'http://img/a/b.jpg http://img/c.jpg', "
+            "'/data/catawiki_1__a_b.jpg')")
+
+    upgrade_schema(engine)
+    columns = {c['name'] for c in \
+        inspect(engine).get_columns('catawiki_auctions')}
+    assert 'image_urls' not in columns and 'image_paths' not in columns
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql('SELECT url, position, path '
+            'FROM catawiki_auction_images ORDER BY position').fetchall() == [
+            ('http://img/a/b.jpg', 0, '/data/catawiki_1__a_b.jpg'),
+            ('http://img/c.jpg', 1, None)]
+
+
+def test_converts_prices_to_minor_units(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    upgrade_schema(engine)
+    created = '2020-01-01 00:00:00.000000'
+    with engine.begin() as connection:
+        connection.exec_driver_sql('UPDATE schema_version SET version = 4')
+        connection.exec_driver_sql('INSERT INTO catawiki_auctions '
+            '(id, date_created, date_modified, currency, latest_price, '
+            'starting_price) VALUES (?, ?, ?, ?, ?, ?)',
+            [('1', created, created, 'EUR', '7.25', '-1'),
+                ('2', created, created, 'JPY', '1500.0', None)])
+
+    assert upgrade_schema(engine) == [5]
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql('SELECT id, latest_price, '
+            'starting_price, date_modified FROM catawiki_auctions '
+            'ORDER BY id').fetchall() == [('1', 725, None, created),
+                ('2', 1500, None, created)]
+    indexes = {i['name'] for i in \
+        inspect(engine).get_indexes('catawiki_auctions')}
+    assert 'ix_catawiki_auctions_currency_latest_price' in indexes
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pytest
+
+from auction_scraper.parity import parser_parity, _scrape_saved_page
+from auction_scraper.scrapers.catawiki.scraper import CataWikiAuctionScraper
+from auction_scraper.scrapers.ebay.scraper import EbayAuctionScraper
+from auction_scraper.scrapers.liveauctioneers.scraper import \
+    LiveAuctioneersAuctionScraper
+
+pytest.importorskip('lxml')
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+BACKENDS = {
+    'catawiki': (CataWikiAuctionScraper, {}),
+    'ebay': (EbayAuctionScraper, {}),
+    'liveauctioneers': (LiveAuctioneersAuctionScraper,
+        {'archive_search': False}),
+}
+
+# A field of each saved page, so a page that fails the same way under
+# every parser doesn't pass unnoticed
+EXPECTED = {
+    ('catawiki', 'auction'): ('expert_estimate_max', 45000),
+    ('catawiki', 'profile'): ('name', 'Zilver & Co'),
+    ('ebay', 'auction'): ('latest_price', 4500),
+    ('ebay', 'profile'): ('location', 'United Kingdom'),
+    ('liveauctioneers', 'auction'): ('latest_price', 65050),
+    ('liveauctioneers', 'profile'): ('n_followers', 1200),
+}
+
+
+@pytest.mark.parametrize('backend, kind', sorted(EXPECTED))
+def test_parsers_agree_on_saved_pages(tmp_path, backend, kind):
+    scraper_class, kwargs = BACKENDS[backend]
+    scraper = scraper_class(db_path=tmp_path / 'db.sqlite', **kwargs)
+    try:
+        paths = sorted((FIXTURES / backend).glob(f'{kind}-*.html'))
+        assert paths
+        assert parser_parity(scraper, kind, paths) == []
+
+        field, value = EXPECTED[(backend, kind)]
+        assert _scrape_saved_page(scraper, kind, paths[0],
+            'html.parser')[field] == value
+    finally:
+        scraper.close()
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from auction_scraper.abstract_models import Base
+from auction_scraper.persistence import PersistenceService
+from auction_scraper.prices import price_history
+from auction_scraper.scrapers.catawiki.models import CataWikiAuction, \
+    CataWikiProfile, CataWikiAuctionImage, CataWikiAuctionSnapshot
+from auction_scraper.scrapers.ebay.models import EbayAuction, \
+    EbayAuctionSnapshot
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def test_upsert_updates_only_set_columns(engine):
+    writer = PersistenceService(engine, batch_size=10, max_delay=None)
+    writer.submit(CataWikiAuction(id='1', title='first', seller_id='9'))
+    writer.submit({'id': '9', 'name': 'seller'}, CataWikiProfile)
+    writer.flush()
+    with Session(engine) as session:
+        created = session.get(CataWikiAuction, '1').date_created
+
+    writer.write(CataWikiAuction(id='1', latest_price=500))
+    writer.close()
+    with Session(engine) as session:
+        auction = session.get(CataWikiAuction, '1')
+        assert auction.title == 'first'
+        assert auction.latest_price == 500
+        assert auction.date_created == created
+        assert session.get(CataWikiProfile, '9').name == 'seller'
+
+
+def test_failures_reported_per_item(engine):
+    writer = PersistenceService(engine, batch_size=10, max_delay=None)
+    good = writer.submit(CataWikiProfile(id='1'))
+    bad = writer.submit(CataWikiProfile(id='2', date_created=None))
+    writer.close()
+    assert good.result().id == '1'
+    assert isinstance(bad.exception(), IntegrityError)
+
+
+def test_images_written_with_their_auction(engine):
+    writer = PersistenceService(engine, batch_size=10, max_delay=None)
+    auction = CataWikiAuction(id='1')
+    auction.images = [CataWikiAuctionImage(url='http://img/a.jpg', position=0)]
+    writer.write(auction)
+    writer.close()
+    with Session(engine) as session:
+        image = session.get(CataWikiAuctionImage, ('http://img/a.jpg', '1'))
+        assert image.position == 0 and image.path is None
+
+
+def test_snapshots_written_only_when_changed(engine):
+    writer = PersistenceService(engine, batch_size=10, max_delay=None)
+    start = datetime(2021, 6, 1)
+    for hour, price, n_bids in ((0, 500, 1), (1, 500, 1), (2, 750, 2),
+            (3, 750, 2)):
+        auction = CataWikiAuction(id='1', latest_price=price, n_bids=n_bids,
+            currency='EUR')
+        auction.snapshots = [CataWikiAuctionSnapshot.from_auction(auction,
+            start + timedelta(hours=hour))]
+        writer.submit(auction)
+        if hour == 0:
+            writer.flush()
+    writer.close()
+
+    with engine.connect() as connection:
+        history = price_history(connection, CataWikiAuctionSnapshot, ['1', '2'])
+    assert history == {'1': [(start, 500, 1, 0),
+        (start + timedelta(hours=2), 750, 2, 0)], '2': []}
+
+
+def test_snapshots_of_int_ids_written_only_when_changed(engine):
+    # eBay gives its ids as ints, stored as text
+    writer = PersistenceService(engine, batch_size=10, max_delay=None)
+    start = datetime(2021, 6, 1)
+    for hour in range(3):
+        auction = EbayAuction(id=123456789012, latest_price=500, n_bids=1,
+            currency='GBP')
+        auction.snapshots = [EbayAuctionSnapshot.from_auction(auction,
+            start + timedelta(hours=hour))]
+        writer.write(auction)
+    writer.close()
+
+    with engine.connect() as connection:
+        history = price_history(connection, EbayAuctionSnapshot,
+            ['123456789012'])
+    assert history == {'123456789012': [(start, 500, 1, 0)]}
+
+
+def test_images_replaced_with_their_auction(engine):
+    writer = PersistenceService(engine, batch_size=10, max_delay=None)
+    for urls in (('a', 'b', 'c'), ('c', 'd')):
+        auction = CataWikiAuction(id='1')
+        auction.images = [CataWikiAuctionImage(url=f'http://img/{u}.jpg',
+            position=i) for i, u in enumerate(urls)]
+        writer.write(auction)
+    # Written without images, leaving them be
+    writer.write(CataWikiAuction(id='1', title='first'))
+    writer.close()
+    with Session(engine) as session:
+        images = session.get(CataWikiAuction, '1').images
+        assert [(i.url, i.position) for i in images] == \
+            [('http://img/c.jpg', 0), ('http://img/d.jpg', 1)]
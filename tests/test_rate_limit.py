@@ -0,0 +1,25 @@
+from auction_scraper.rate_limit import RateLimiter, TokenBucket, \
+    SQLiteTokenBucket
+
+
+def test_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=10, capacity=3)
+    assert [bucket._reserve() for _ in range(3)] == [0, 0, 0]
+    assert 0.09 < bucket._reserve() <= 0.1
+
+
+def test_limiter_matches_exact_host_before_suffix():
+    limiter = RateLimiter({'www.ebay.com': (1, 1), '.ebayimg.com': (5, 5)})
+    assert limiter.bucket('www.ebay.com').rate == 1
+    assert limiter.bucket('i.ebayimg.com').rate == 5
+    assert limiter.bucket('ebayimg.com').rate == 5
+    assert limiter.bucket('example.com') is None
+
+
+def test_sqlite_buckets_share_one_budget(tmp_path):
+    path = tmp_path.joinpath('limits.db')
+    a = SQLiteTokenBucket(path, 'host', rate=1, capacity=2)
+    b = SQLiteTokenBucket(path, 'host', rate=1, capacity=2)
+    assert a._reserve() == 0
+    assert b._reserve() == 0
+    assert b._reserve() > 0.9
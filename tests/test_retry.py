@@ -0,0 +1,100 @@
+from email.utils import formatdate
+
+import pytest
+
+from auction_scraper import retry
+from auction_scraper.retry import RetryPolicy, CircuitBreaker, \
+    CircuitOpenError
+from auction_scraper.http_cache import build_response
+from auction_scraper.scrapers.catawiki.scraper import CataWikiAuctionScraper
+
+
+class Clock():
+    def __init__(self):
+        self.now = 1622548800.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry, 'time', clock)
+    return clock
+
+
+def response(headers):
+    return build_response('http://a', 503, headers, b'')
+
+
+def test_backoff_grows_with_jitter():
+    policy = RetryPolicy(max_retries=3, backoff=2, max_backoff=5)
+    for attempt, backoff in ((0, 2), (1, 4), (2, 5)):
+        assert backoff / 2 <= policy.delay(attempt) <= backoff
+    assert policy.delay(3) is None
+
+
+def test_retry_after_seconds_and_date(clock):
+    policy = RetryPolicy(max_retry_after=120)
+    assert policy.delay(0, response({'Retry-After': '30'})) == 30
+    date = formatdate(clock.now + 90, usegmt=True)
+    assert policy.delay(0, response({'Retry-After': date})) == 90
+    # Dates already past mean retrying now
+    date = formatdate(clock.now - 90, usegmt=True)
+    assert policy.delay(0, response({'Retry-After': date})) == 0
+
+
+def test_retry_after_beyond_cap_not_retried(clock):
+    policy = RetryPolicy(max_retry_after=120)
+    assert policy.delay(0, response({'Retry-After': '121'})) is None
+    date = formatdate(clock.now + 3600, usegmt=True)
+    assert policy.delay(0, response({'Retry-After': date})) is None
+    # Unparseable, so backed off as usual
+    assert policy.delay(0, response({'Retry-After': 'soon'})) is not None
+
+
+def test_circuit_pauses_then_opens(clock):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=10, max_trips=2)
+    breaker.record_failure('a')
+    assert breaker.wait('a') == 0
+    breaker.record_failure('a')
+    # Tripped: paused for reset_timeout, doubling on each trip
+    assert breaker.wait('a') == 10
+    breaker.record_failure('a')
+    assert breaker.wait('a') == 20
+    assert breaker.wait('b') == 0
+
+    breaker.record_failure('a')
+    with pytest.raises(CircuitOpenError):
+        breaker.wait('a')
+
+
+def test_success_resets_circuit(clock):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=10, max_trips=0)
+    breaker.record_failure('a', 'blocked')
+    breaker.record_success('a', 'blocked')
+    breaker.record_failure('a', 'blocked')
+    assert breaker.wait('a') == 0
+    # Failures of each kind are counted apart
+    breaker.record_failure('a', 'transport')
+    assert breaker.wait('a') == 0
+
+
+def test_repeated_refusals_open_circuit(tmp_path, clock):
+    scraper = CataWikiAuctionScraper(db_path=tmp_path / 'db.sqlite')
+    scraper.circuit_breaker = CircuitBreaker(threshold=2, reset_timeout=10,
+        max_trips=0)
+    scraper.session.get = lambda uri, **_: build_response(uri, 403, {}, b'')
+    try:
+        for _ in range(2):
+            assert scraper._fetch('http://a/').status_code == 403
+        with pytest.raises(CircuitOpenError):
+            scraper._fetch('http://a/')
+    finally:
+        scraper.close()
@@ -0,0 +1,49 @@
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from auction_scraper.scrapers.ebay.rwidgets import extract_rwidgets, \
+    rwidgets_scripts
+
+DUPLICATES = ('maxImageUrl', 'displayImgUrl')
+FIXTURES = Path(__file__).parent / 'fixtures' / 'ebay'
+
+
+def test_collects_properties_across_calls():
+    script = '''$rwidgets(['a', {it: "Title", "kw": 'kw', n: 12.5,
+        maxImageUrl: "http://a", displayImgUrl: null}],
+        ['b', {maxImageUrl: null, displayImgUrl: "http://b"}]);
+        $rwidgets({it: null, u: undefined, g: a.b, j: /ab+c/g, nested: {x: 1}});'''
+    assert extract_rwidgets([script], DUPLICATES) == {
+        'it': 'Title', 'kw': "'kw'", 'n': '12.5',
+        'maxImageUrl': ['http://a', 'null'],
+        'displayImgUrl': ['null', 'http://b'],
+        'u': 'undefined', 'g': '', 'j': '/ab+c/g', 'nested': '', 'x': '1'}
+
+
+def test_ignores_declarations_and_other_calls():
+    script = '''var z = 1; foo.$rwidgets({no: 1});
+        $rwidgets(function() { var a = 1, b = 2; c = 3
+            d.e = "f" });'''
+    assert extract_rwidgets([script]) == {'c': '3', '': 'f'}
+
+
+def test_byte_order_mark_is_space():
+    script = '\ufeff$rwidgets({it: "Title"});'
+    assert extract_rwidgets([script]) == {'it': 'Title'}
+
+
+def test_saved_auction_page():
+    with open(FIXTURES / 'auction-123456789012.html', encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+    image = 'https:\\/\\/i.ebayimg.com\\/images\\/g\\/{}\\/s-l{}.jpg'
+    assert extract_rwidgets(rwidgets_scripts(soup), DUPLICATES) == {
+        'maxImageUrl': [image.format('aaa', 1600), 'null'],
+        'displayImgUrl': [image.format('aaa', 500), image.format('bbb', 500)],
+        'itemId': '123456789012', 'it': 'Vintage Brass Ship Compass',
+        'kw': 'Vintage Brass Ship Compass', 'entityId': 'old_salt',
+        'entityName': 'old_salt', 'startTime': '1622548800000',
+        'endTime': '1623153600000', 'bids': '7', 'ccode': 'GBP',
+        'bidPriceDouble': '45.0', 'locale': 'en_GB', 'totalQty': '1',
+        'vatIncluded': 'false', 'currentDomain': 'www.ebay.co.uk',
+        'isSold': 'false', 'qtyLeft': '', 'onClick': ''}
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from auction_scraper.abstract_models import Base
+from auction_scraper.scheduler import RefreshPolicy, CloseSchedule, \
+    plan_refresh, fresh_profiles, closing_auctions, NEW, LIVE_SOON, LIVE_LATER, FINISHED
+from auction_scraper.scrapers.catawiki.models import CataWikiAuction, \
+    CataWikiProfile
+
+
+def test_plan_sorts_results_into_tiers(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    Base.metadata.create_all(engine)
+    now = datetime(2021, 6, 1, 12)
+    hour = timedelta(hours=1)
+    rows = [
+        # Ending soon, seen two hours ago, and seen just now
+        {'id': 'soon', 'end_time': now + hour, 'last_seen': now - 2 * hour},
+        {'id': 'fresh', 'end_time': now + hour, 'last_seen': now},
+        {'id': 'later', 'end_time': now + 72 * hour, 'last_seen': now - hour},
+        # Ended since it was last seen, and seen since it ended
+        {'id': 'ended', 'end_time': now - hour, 'last_seen': now - 2 * hour},
+        {'id': 'done', 'end_time': now - 2 * hour, 'last_seen': now - hour},
+        {'id': 'closed', 'end_time': now + hour, 'last_seen': now - 2 * hour,
+            'closed': True},
+    ]
+    with engine.begin() as connection:
+        for row in rows:
+            connection.execute(CataWikiAuction.__table__.insert(), row)
+        plan = plan_refresh(connection, CataWikiAuction,
+            ['new', 'soon', 'fresh', 'later', 'ended', 'done', 'closed'],
+            RefreshPolicy(), ('closed', 'sold'), now=now)
+
+    assert plan.tiers == {NEW: ['new'], LIVE_SOON: ['soon', 'fresh', 'ended'],
+        LIVE_LATER: ['later'], FINISHED: ['done', 'closed']}
+    assert plan.due == ['new', 'soon', 'ended']
+
+
+def test_close_schedule_batches_nearby_closes():
+    start = datetime(2021, 6, 1, 12)
+    minute = timedelta(minutes=1)
+    schedule = CloseSchedule(grace=minute, window=5 * minute)
+    for auction_id, offset in (('a', 0), ('b', 4), ('c', 10), ('d', 12)):
+        schedule.push(auction_id, start + offset * minute)
+    # Extended past the first batch
+    schedule.push('b', start + 11 * minute)
+
+    assert schedule.pop_batch() == (start + minute, ['a'])
+    assert schedule.pop_batch() == (start + 13 * minute, ['c', 'b', 'd'])
+    assert schedule.pop_batch() is None
+
+
+def test_fresh_profiles_within_ttl(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    Base.metadata.create_all(engine)
+    now = datetime(2021, 6, 1, 12)
+    with engine.begin() as connection:
+        for profile_id, hours in (('fresh', 1), ('stale', 30)):
+            connection.execute(CataWikiProfile.__table__.insert(),
+                {'id': profile_id, 'last_seen': now - timedelta(hours=hours)})
+        assert fresh_profiles(connection, CataWikiProfile,
+            timedelta(hours=24), now=now) == {'fresh'}
+
+
+def test_closing_auctions_skips_those_seen_after_closing(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    Base.metadata.create_all(engine)
+    now = datetime(2021, 6, 1, 12)
+    hour = timedelta(hours=1)
+    rows = [
+        # Closing soon, and closed since it was last seen
+        {'id': 'soon', 'end_time': now + hour, 'last_seen': now - hour},
+        {'id': 'ended', 'end_time': now - hour, 'last_seen': now - 2 * hour},
+        # Closed and seen since, seen since by modification alone, followed,
+        # and sold
+        {'id': 'seen', 'end_time': now - 2 * hour, 'last_seen': now - hour},
+        {'id': 'old', 'end_time': now - 48 * hour,
+            'date_modified': now - 24 * hour},
+        {'id': 'followed', 'end_time': now - hour,
+            'last_seen': now - 2 * hour, 'final_fetched_at': now - hour},
+        {'id': 'sold', 'end_time': now - hour, 'last_seen': now - 2 * hour,
+            'sold': True},
+        {'id': 'later', 'end_time': now + 48 * hour, 'last_seen': now},
+    ]
+    with engine.begin() as connection:
+        for row in rows:
+            connection.execute(CataWikiAuction.__table__.insert(), row)
+        closing = closing_auctions(connection, CataWikiAuction,
+            now + 6 * hour, ('closed', 'sold'))
+
+    assert [auction_id for auction_id, _, _ in closing] == ['ended', 'soon']
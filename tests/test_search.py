@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from auction_scraper.abstract_scraper import SearchResult
+from auction_scraper.scrapers.catawiki.scraper import CataWikiAuctionScraper
+
+
+class StubSearchScraper(CataWikiAuctionScraper):
+    """
+    Serves search pages of page_sizes results in turn, reporting total
+    """
+    page_sizes = ()
+    total = None
+
+    def _generate_search_uri(self, query_string, n_page):
+        return str(n_page)
+
+    def _scrape_search_page(self, uri):
+        n_page = int(uri)
+        with self.lock:
+            self.requested.append(n_page)
+        size = self.page_sizes[n_page - 1] \
+            if n_page <= len(self.page_sizes) else 0
+        results = {f'{n_page}-{i}': SearchResult(f'{n_page}-{i}', None) \
+            for i in range(size)}
+        return results, self.total, b''
+
+
+@pytest.fixture
+def scraper(tmp_path):
+    scraper = StubSearchScraper(db_path=tmp_path / 'db.sqlite')
+    scraper.lock = threading.Lock()
+    scraper.requested = []
+    yield scraper
+    scraper.close()
+
+
+def test_pages_bounded_by_total(scraper):
+    scraper.page_sizes = (10, 10, 5, 10)
+    scraper.total = 25
+    assert len(scraper.scrape_search('q')) == 25
+    assert sorted(scraper.requested) == [1, 2, 3]
+
+
+def test_pages_bounded_by_n_results(scraper):
+    scraper.page_sizes = (10,) * 10
+    scraper.total = 100
+    assert len(scraper.scrape_search('q', n_results=25)) == 25
+    assert sorted(scraper.requested) == [1, 2, 3]
+
+    # Without a total, only the pages n_results needs are fetched
+    scraper.requested = []
+    scraper.total = None
+    assert len(scraper.scrape_search('q', n_results=15)) == 15
+    assert sorted(scraper.requested) == [1, 2]
+
+
+def test_short_pages_not_taken_as_last(scraper):
+    scraper.page_sizes = (10, 10, 4, 10)
+    assert len(scraper.scrape_search('q')) == 34
+    assert scraper.requested == [1, 2, 3, 4, 5]
+
+    # Nor short of the total, which is fetched in full
+    scraper.requested = []
+    scraper.page_sizes = (10, 4, 10, 10)
+    scraper.total = 34
+    assert len(scraper.scrape_search('q')) == 34
+    assert sorted(scraper.requested) == [1, 2, 3, 4]
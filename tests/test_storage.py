@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import create_engine, event
+
+from auction_scraper.storage import sqlite_pragmas, configure_sqlite, \
+    create_sqlite_engine
+
+
+def test_pragmas_applied_on_connect(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'db.sqlite'))
+    configure_sqlite(engine, sqlite_pragmas('bulk-load', synchronous='normal',
+        cache_size=8 * 1024 * 1024))
+    with engine.connect() as c:
+        assert c.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert c.exec_driver_sql('PRAGMA synchronous').scalar() == 1
+        assert c.exec_driver_sql('PRAGMA cache_size').scalar() == -8192
+
+
+def test_connections_kept_between_sessions(tmp_path):
+    engine = create_sqlite_engine(tmp_path / 'db.sqlite',
+        sqlite_pragmas(cache_size=8 * 1024 * 1024))
+    connects = []
+    event.listen(engine, 'connect', lambda *_: connects.append(1))
+    for _ in range(3):
+        with engine.connect() as c:
+            assert c.exec_driver_sql('PRAGMA cache_size').scalar() == -8192
+    assert len(connects) == 1
+    engine.dispose()
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        sqlite_pragmas('fast')
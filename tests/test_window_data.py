@@ -0,0 +1,21 @@
+from auction_scraper.scrapers.liveauctioneers.window_data import \
+    extract_window_data, window_data_text
+
+
+def test_maps_bare_undefined_to_none():
+    page = '<script data-reactroot="">window.__data={"a": undefined, ' \
+        '"b": [1, undefined, {"c": "undefined here", "d": undefined}], ' \
+        '"e": {"f": 1.5}};</script>'
+    assert extract_window_data(page) == {'a': None,
+        'b': [1, None, {'c': 'undefined here', 'd': None}], 'e': {'f': 1.5}}
+
+
+def test_missing_payload():
+    assert extract_window_data('<html></html>') is None
+
+
+def test_payload_text_left_undecoded():
+    page = '<script>window.__data= {"a": undefined};</script>' \
+        '<script>var b = 1;</script>'
+    assert window_data_text(page) == '{"a": undefined}'
+    assert window_data_text('<html></html>') is None